@@ -0,0 +1,72 @@
+import threading
+import time
+
+import metrics as Metrics
+import settings as Settings
+import store as Store
+import usage as Usage
+
+# Changes are marked dirty from the UI thread and written by a background
+# writer, a burst of changes within autosave_delay is written at once
+
+cond = threading.Condition()
+write_lock = threading.Lock()  # Keeps the writer and flush from overlapping
+dirty = set()  # What needs writing: "settings", "phrases", "compact" or "usage"
+writer = None
+
+def start():
+    global writer
+
+    if writer:
+        return
+
+    writer = threading.Thread(target=run, daemon=True)
+    writer.start()
+
+def mark(what):
+    """Mark something dirty and wake the writer"""
+    with cond:
+        dirty.add(what)
+        cond.notify()
+
+def run():
+    while True:
+        with cond:
+            while not dirty:
+                cond.wait()
+
+        # Let the burst settle so it goes out in one write
+        time.sleep(Settings.get("autosave_delay"))
+        write()
+
+def write():
+    """Write everything that is dirty"""
+    with write_lock:
+        with cond:
+            work = set(dirty)
+            dirty.clear()
+
+        try:
+            if "compact" in work:
+                start = time.monotonic()
+                # The snapshot includes any pending phrase changes
+                Store.compact()
+                Metrics.record("save_compact", start)
+            elif "phrases" in work:
+                start = time.monotonic()
+                Store.flush()
+                Metrics.record("save_phrases", start)
+
+            if "settings" in work:
+                start = time.monotonic()
+                Settings.write()
+                Metrics.record("save_settings", start)
+
+            if "usage" in work:
+                Usage.flush()
+        except Exception as e:
+            print(f"Error autosaving: {e}")
+
+def flush():
+    """Write pending changes now, used before exiting"""
+    write()
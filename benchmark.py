@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Measure how Strudel behaves as the phrase list grows
+
+Each list size runs in its own process against a throwaway copy of the
+app, with fake_synth.py standing in for espeak and aplay. A virtual X
+server is started when there is no display. Results are written as JSON
+so runs of different versions can be compared.
+
+    python benchmark.py --sizes 50,5000,100000 --output benchmark.json
+
+With --check-idle only the idle wakeups are counted, and it exits with
+an error if the app woke up at all while idle.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SIZES = [50, 500, 5000, 50000, 100000]
+IDLE = 2  # Seconds the app is left alone to count its wakeups
+WORDS = ["hello", "water", "please", "thank", "you", "yes", "no", "help",
+         "me", "now", "later", "food", "drink", "where", "is", "the", "bathroom"]
+
+def summarize(samples):
+    """Milliseconds summary of a list of seconds"""
+    if not samples:
+        return None
+
+    ms = sorted(sample * 1000 for sample in samples)
+
+    return {
+        "count": len(ms),
+        "median": statistics.median(ms),
+        "p95": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "max": ms[-1],
+    }
+
+def make_phrase(length):
+    words = []
+
+    while len(" ".join(words)) < length:
+        words.append(random.choice(WORDS))
+
+    return " ".join(words)
+
+def prepare(dirpath, size, phrase_length):
+    """Copy the app into dirpath and give it size phrases and the fake synth"""
+    source = Path(__file__).parent.resolve()
+
+    for filepath in source.glob("*.py"):
+        shutil.copy(filepath, dirpath)
+
+    fake = f"{sys.executable} {dirpath / 'fake_synth.py'}"
+
+    settings = {
+        "synth": str(dirpath / "fake_synth.py"),
+        "player": f"{fake} --play",
+        "voice": "default",
+        "num_items": size,
+        "width": 660,
+        "height": 700,
+    }
+
+    with open(dirpath / "settings.txt", "w") as file:
+        file.write("\n".join(f"{key}={value}" for key, value in settings.items()))
+
+    with open(dirpath / "speech.txt", "w") as file:
+        file.write("\n".join(make_phrase(phrase_length) for _ in range(size)))
+
+    with open(dirpath / "voices.txt", "w") as file:
+        file.write("default")
+
+    os.chmod(dirpath / "fake_synth.py", 0o755)
+
+def wait_for_stamp(filepath, count, timeout=5):
+    """Wait until the fake synth has written count stamps, return the last one"""
+    end = time.time() + timeout
+
+    while time.time() < end:
+        try:
+            with open(filepath, "r") as file:
+                stamps = file.read().split()
+
+            if len(stamps) >= count:
+                return float(stamps[count - 1])
+        except FileNotFoundError:
+            pass
+
+        time.sleep(0.001)
+
+    return None
+
+def count_wakeups(window, seconds):
+    """Times the event loop woke up while nothing was going on.
+
+    The loop is run by hand so every event it handles is counted, the
+    timer that ends the period is the only one expected.
+    """
+    done = False
+
+    def finish():
+        nonlocal done
+        done = True
+
+    # Let what setup left behind settle first
+    window.update()
+    window.after(int(seconds * 1000), finish)
+    iterations = 0
+
+    while not done:
+        window.tk.dooneevent()
+        iterations += 1
+
+    return iterations - 1
+
+def run_child(dirpath, rounds, idle_only=False):
+    """Runs inside the copy of the app, returns the measurements"""
+    sys.path.insert(0, str(dirpath))
+    os.chdir(dirpath)
+
+    import settings as Settings
+    import window as Window
+    import inputs as Inputs
+    import filterwid as Filter
+    import speech as Speech
+    import widgets as Widgets
+    import autosave as Autosave
+    import strudel as Strudel
+
+    results = {}
+    stamp_path = dirpath / "stamps.txt"
+    os.environ["FAKE_SYNTH_STAMP"] = str(stamp_path)
+
+    start = time.perf_counter()
+    Settings.setup()
+    results["settings_setup"] = summarize([time.perf_counter() - start])
+    Autosave.start()
+
+    # Time inputs.setup on its own as well as the whole window
+    inputs_setup = Inputs.setup
+    inputs_time = []
+
+    def timed_inputs_setup():
+        start = time.perf_counter()
+        inputs_setup()
+        inputs_time.append(time.perf_counter() - start)
+
+    Inputs.setup = timed_inputs_setup
+
+    start = time.perf_counter()
+    Window.setup()
+    Widgets.setup()
+    Window.window.update()
+    results["window_setup"] = summarize([time.perf_counter() - start])
+    results["inputs_setup"] = summarize(inputs_time)
+    Speech.setup()
+    Speech.warm()
+    Strudel.setup_signals()
+
+    window = Window.window
+    results["idle_wakeups"] = count_wakeups(window, IDLE)
+
+    if idle_only:
+        Speech.shutdown()
+        window.destroy()
+        return results
+
+    # One keystroke at a time, through the trace and the idle update
+    keystrokes = []
+
+    for _ in range(rounds):
+        query = ""
+
+        for char in random.choice(WORDS) + " " + random.choice(WORDS):
+            query += char
+            start = time.perf_counter()
+            Filter.filter_var.set(query)
+            window.update()
+            keystrokes.append(time.perf_counter() - start)
+
+        Filter.clear()
+        window.update()
+
+    results["filter_keystroke"] = summarize(keystrokes)
+
+    # A fast typist, several keystrokes land before the next update
+    bursts = []
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+
+        for i in range(1, 6):
+            Filter.filter_var.set("water"[:i])
+
+        window.update()
+        bursts.append(time.perf_counter() - start)
+        Filter.clear()
+        window.update()
+
+    results["filter_burst"] = summarize(bursts)
+
+    # Direct calls, without the debounce
+    applies = []
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        Filter.apply(random.choice(WORDS))
+        window.update_idletasks()
+        applies.append(time.perf_counter() - start)
+
+    Filter.clear()
+    window.update()
+    results["filter_apply"] = summarize(applies)
+
+    size = Settings.get("num_items")
+    ups = []
+    downs = []
+
+    for _ in range(rounds):
+        n = random.randrange(1, size - 1)
+
+        start = time.perf_counter()
+        Inputs.move_item_up(n)
+        window.update_idletasks()
+        ups.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        Inputs.move_item_down(n)
+        window.update_idletasks()
+        downs.append(time.perf_counter() - start)
+
+    results["move_item_up"] = summarize(ups)
+    results["move_item_down"] = summarize(downs)
+
+    # Speak twice per phrase, a cache miss and then a hit
+    misses = []
+    hits = []
+    count = 0
+
+    for _ in range(rounds):
+        n = random.randrange(size)
+
+        for samples in [misses, hits]:
+            start = time.time()
+            Speech.callback(n)
+            count += 1
+            stamp = wait_for_stamp(stamp_path, count)
+
+            if stamp is None:
+                print(f"No speech for phrase {n}", file=sys.stderr)
+                count -= 1
+                continue
+
+            samples.append(stamp - start)
+            # Give the background cache fill time to land
+            time.sleep(0.2)
+
+    results["speak_miss"] = summarize(misses)
+    results["speak_hit"] = summarize(hits)
+
+    Speech.shutdown()
+    Autosave.flush()
+    window.destroy()
+    return results
+
+def start_display():
+    """Start a virtual X server if there is no display, returns the process"""
+    if os.environ.get("DISPLAY"):
+        return None
+
+    xvfb = shutil.which("Xvfb")
+
+    if not xvfb:
+        sys.exit("No DISPLAY and no Xvfb to start one")
+
+    display = ":99"
+    process = subprocess.Popen([xvfb, display, "-screen", "0", "1280x1024x24"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    # Give the server a moment to accept connections
+    time.sleep(1)
+    return process
+
+def get_version():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                       cwd=Path(__file__).parent, text=True).strip()
+    except Exception:
+        return None
+
+def check_idle():
+    """Count the wakeups of an idle app, returns the exit status"""
+    display = start_display()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            prepare(Path(tmpdir), SIZES[0], 30)
+            process = subprocess.run([sys.executable, __file__, "--child", tmpdir, "--check-idle"],
+                                     capture_output=True, text=True)
+    finally:
+        if display:
+            display.terminate()
+
+    if process.returncode != 0:
+        print(process.stderr, file=sys.stderr)
+        return process.returncode
+
+    wakeups = json.loads(process.stdout.strip().split("\n")[-1])["idle_wakeups"]
+    print(f"Idle wakeups in {IDLE}s: {wakeups}")
+    return 1 if wakeups > 0 else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Strudel performance benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma separated list sizes")
+    parser.add_argument("--phrase-length", type=int, default=30,
+                        help="characters per generated phrase")
+    parser.add_argument("--rounds", type=int, default=10,
+                        help="samples per measurement")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--check-idle", action="store_true",
+                        help="only check that the idle app doesn't wake up")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    if args.child:
+        results = run_child(Path(args.child), args.rounds, args.check_idle)
+        print(json.dumps(results))
+        return
+
+    if args.check_idle:
+        sys.exit(check_idle())
+
+    display = start_display()
+    report = {
+        "version": get_version(),
+        "python": platform.python_version(),
+        "phrase_length": args.phrase_length,
+        "rounds": args.rounds,
+        "sizes": {},
+    }
+
+    try:
+        for size in map(int, args.sizes.split(",")):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                dirpath = Path(tmpdir)
+                prepare(dirpath, size, args.phrase_length)
+
+                process = subprocess.run([sys.executable, __file__, "--child", tmpdir,
+                                          "--rounds", str(args.rounds)],
+                                         capture_output=True, text=True)
+
+                if process.returncode != 0:
+                    print(process.stderr, file=sys.stderr)
+                    report["sizes"][size] = {"error": process.returncode}
+                    continue
+
+                # The app prints too, the results are the last line
+                report["sizes"][size] = json.loads(process.stdout.strip().split("\n")[-1])
+                print(f"{size}: {json.dumps(report['sizes'][size])}")
+    finally:
+        if display:
+            display.terminate()
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from subprocess import Popen, PIPE
+
+import settings as Settings
+
+# Clips are rendered once at the synth's default speed and full volume,
+# speed and volume are applied to the samples when they are played, so
+# changing either doesn't make the cache stale
+
+WPM = 175  # Words per minute clips are rendered at
+AMPLITUDE = 100
+
+cache_lock = threading.Lock()
+clips = None  # Size of each clip by path, least recently used first, read from disk once
+total = 0  # Bytes in clips
+
+def get_cache_path():
+    thispath = Path(__file__).parent.resolve()
+    dirpath = Path(thispath) / "cache"
+    return dirpath
+
+def get_key(synth, voice, text):
+    """Content address of a rendered clip"""
+    data = "\0".join([synth, voice, text])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def get_file(key):
+    return get_cache_path() / f"{key}.wav"
+
+def has(synth, voice, text):
+    """Whether a clip is cached, without counting it as used"""
+    return get_file(get_key(synth, voice, text)).exists()
+
+def load():
+    """Read the cache directory into clips, the only time it is listed"""
+    global clips, total
+
+    if clips is not None:
+        return
+
+    files = []
+
+    try:
+        for filepath in get_cache_path().glob("*.wav"):
+            stat = filepath.stat()
+            files.append((stat.st_mtime, filepath, stat.st_size))
+    except OSError as e:
+        print(f"Error reading cache: {e}")
+
+    # Oldest first
+    files.sort()
+    clips = OrderedDict((filepath, size) for _, filepath, size in files)
+    total = sum(clips.values())
+
+def get_size():
+    """Total size of the cached clips in bytes"""
+    with cache_lock:
+        load()
+        return total
+
+def use(filepath, size=None):
+    """Mark a clip as the most recently used, size is given for a new one"""
+    global total
+
+    if filepath not in clips:
+        # Rendered by another process sharing the cache
+        if size is None:
+            size = filepath.stat().st_size
+
+        clips[filepath] = size
+        total += size
+    elif size is not None:
+        total += size - clips[filepath]
+        clips[filepath] = size
+
+    clips.move_to_end(filepath)
+
+def forget(filepath):
+    global total
+
+    size = clips.pop(filepath, None)
+
+    if size is not None:
+        total -= size
+
+def lookup(synth, voice, text):
+    """Return the cached wav file for this voice and text, or None on a miss"""
+    filepath = get_file(get_key(synth, voice, text))
+
+    with cache_lock:
+        load()
+
+        try:
+            # The mtime keeps the order for the next start
+            os.utime(filepath)
+            use(filepath)
+        except OSError:
+            # Evicted by another process sharing the cache
+            forget(filepath)
+            return None
+
+    return filepath
+
+def render(synth, voice, text, on_spawn=None, background=False):
+    """Render text into the cache with the synth's write-to-file mode.
+
+    Background renders run at low priority so they don't compete with
+    speech that was asked for. Returns the wav path, or None if the
+    synth was interrupted. Raises RuntimeError with the synth's message
+    if it failed.
+    """
+    dirpath = get_cache_path()
+    dirpath.mkdir(exist_ok=True)
+
+    filepath = get_file(get_key(synth, voice, text))
+    # Write to a private temp file so readers never see a partial clip
+    tmppath = dirpath / f"{filepath.stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    process = Popen([synth, "-v", voice, "-s", str(WPM), "-a", str(AMPLITUDE),
+                     "-w", str(tmppath), text], stderr=PIPE,
+                    preexec_fn=(lambda: os.nice(10)) if background else None)
+
+    if on_spawn:
+        on_spawn(process)
+
+    _, error = process.communicate()
+
+    if process.returncode != 0:
+        tmppath.unlink(missing_ok=True)
+
+        if error:
+            raise RuntimeError(error.decode().strip())
+
+        return None
+
+    size = tmppath.stat().st_size
+    os.replace(tmppath, filepath)
+
+    with cache_lock:
+        load()
+        use(filepath, size)
+
+    evict(keep=filepath)
+    return filepath
+
+def evict(keep=None):
+    """Delete least recently used clips until the cache fits its size cap.
+
+    The clip in keep survives even if it alone is over the cap, it is
+    about to be played.
+    """
+    limit = Settings.get("cache_size") * 1024 * 1024
+
+    with cache_lock:
+        load()
+
+        try:
+            for filepath in list(clips):
+                if total <= limit:
+                    break
+
+                if filepath == keep:
+                    continue
+
+                filepath.unlink(missing_ok=True)
+                forget(filepath)
+        except Exception as e:
+            print(f"Error evicting cache: {e}")
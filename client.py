@@ -0,0 +1,68 @@
+import itertools
+import json
+import socket
+import threading
+
+import daemon as Daemon
+
+# Talks to the speech daemon, replies are handled on a reader thread
+
+client_lock = threading.Lock()
+sock = None
+ids = itertools.count(1)
+callbacks = {}  # Reply handlers by request id
+
+def connect():
+    """Connect to the daemon, returns whether it worked"""
+    global sock
+
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(str(Daemon.get_socket_path()))
+    except OSError as e:
+        print(f"Error connecting to speech daemon: {e}")
+        sock = None
+        return False
+
+    threading.Thread(target=read, args=(sock,), daemon=True).start()
+    return True
+
+def read(conn):
+    try:
+        for line in conn.makefile("r"):
+            reply = json.loads(line)
+            on_reply = callbacks.pop(reply.get("id"), None)
+
+            if on_reply:
+                on_reply(reply)
+    except (OSError, ValueError) as e:
+        print(f"Lost the speech daemon: {e}")
+
+def request(message, on_reply=None):
+    """Send a request without waiting, on_reply gets the reply on the reader thread"""
+    global sock
+
+    with client_lock:
+        message = dict(message, id=next(ids))
+
+        if on_reply:
+            callbacks[message["id"]] = on_reply
+
+        data = (json.dumps(message) + "\n").encode()
+
+        # Reconnect once if the daemon went away
+        for _ in range(2):
+            if not sock and not connect():
+                break
+
+            try:
+                sock.sendall(data)
+                return
+            except OSError:
+                sock.close()
+                sock = None
+
+    callbacks.pop(message["id"], None)
+
+    if on_reply:
+        on_reply({"ok": False, "error": "The speech daemon is not running"})
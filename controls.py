@@ -1,5 +1,6 @@
 import widgets as Widgets
 import settings as Settings
+import pages as Pages
 import window as Window
 
 def setup(container):
@@ -10,6 +11,7 @@ def setup(container):
     Settings.setup_voice(controls_container)
     Settings.setup_speed(controls_container)
     Settings.setup_volume(controls_container)
+    Pages.setup(controls_container)
 
     # Bottom controls - positioned at the right side and vertically aligned to the bottom
     buttons = Widgets.create_frame(container)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Headless speech daemon
+
+Serves the speech engine on a Unix socket, so switch-access devices and
+other local programs can drive Strudel. The window starts one in-process
+when none is running and talks to it like any other client.
+
+The protocol is one JSON object per line each way. Requests may carry an
+"id", which is echoed back in the reply:
+
+    {"cmd": "speak", "index": 3}
+    {"cmd": "speak", "text": "Hello", "voice": "en", "speed": 1.0, "volume": 0.8}
+    {"cmd": "speak", "text": "Hello", "queue": true, "now": false}
+    {"cmd": "speak", "text": "Help", "queue": true, "priority": "high"}
+    {"cmd": "speak", "text": "Hello", "mix": true}
+    {"cmd": "stop"}
+    {"cmd": "warm", "voice": "en", "speed": 1.0, "volume": 1.0}
+    {"cmd": "list"}
+    {"cmd": "metrics"}
+
+A window using a daemon that runs on its own ("standalone" in replies)
+keeps the daemon's phrases current, so speaking by index follows edits,
+moves and page switches. A daemon inside a window refuses these:
+
+    {"cmd": "phrases", "changes": {"3": "Hello"}}
+    {"cmd": "page", "name": "clinic"}
+
+Replies have "ok", "latency_ms", "standalone" and either "error" or the
+command's result. For speak, latency is the time until audio was on its way.
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from pathlib import Path
+
+import engine as Engine
+import metrics as Metrics
+import mixer as Mixer
+import pages as Pages
+import settings as Settings
+import speechqueue as SpeechQueue
+
+server_loop = None  # Event loop of an in-process daemon
+inflight = {}  # Speak requests being handled, by what they would say
+
+def get_socket_path():
+    thispath = Path(__file__).parent.resolve()
+    filepath = Path(thispath) / "strudel.sock"
+    return filepath
+
+def is_running():
+    """Whether a daemon is accepting connections on the socket"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(get_socket_path()))
+            return True
+    except OSError:
+        return False
+
+def get_params(request):
+    """Voice, words per minute and amplitude for a request, settings fill the gaps"""
+    voice = request.get("voice") or Settings.get("voice")
+    wpm = Engine.get_wpm(request.get("speed", Settings.get("speed")))
+    amplitude = Engine.get_amplitude(request.get("volume", Settings.get("volume")))
+    return voice, wpm, amplitude
+
+async def speak(request):
+    if "text" in request:
+        text = str(request["text"]).strip()
+    else:
+        n = int(request["index"])
+
+        if not 0 <= n < Settings.get("num_items"):
+            raise ValueError(f"No phrase at index {n}")
+
+        text = Settings.speech[n].strip()
+
+    if not text:
+        raise ValueError("Nothing to say")
+
+    voice, wpm, amplitude = get_params(request)
+
+    if request.get("queue"):
+        priority = request.get("priority", "normal")
+
+        if priority not in SpeechQueue.PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        Engine.enqueue(text, voice, wpm, amplitude, request.get("now", False), priority)
+        return {"queued": True}
+
+    if request.get("mix"):
+        # Overlapping is the point, so repeats aren't coalesced
+        return await start(lambda **callbacks: Engine.mix(text, voice, wpm, amplitude, **callbacks))
+
+    # A repeat of a request that is still starting shares its outcome
+    key = (text, voice, wpm, amplitude)
+
+    if key in inflight:
+        result = await asyncio.shield(inflight[key])
+        return dict(result, coalesced=True)
+
+    inflight[key] = asyncio.ensure_future(
+        start(lambda **callbacks: Engine.speak(text, voice, wpm, amplitude, **callbacks)))
+
+    try:
+        return await asyncio.shield(inflight[key])
+    finally:
+        inflight.pop(key, None)
+
+async def start(function):
+    """Call an engine function with callbacks, returns once audio is on its way"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(settle):
+        def run():
+            if not future.done():
+                settle()
+
+        loop.call_soon_threadsafe(run)
+
+    # Engine calls take locks and spawn processes, keep them off the loop
+    await loop.run_in_executor(None, lambda: function(
+        on_start=lambda: resolve(lambda: future.set_result({"started": True})),
+        on_error=lambda message: resolve(lambda: future.set_exception(RuntimeError(message))),
+        # Interrupted before any audio
+        on_end=lambda: resolve(lambda: future.set_result({"started": False}))))
+
+    return await future
+
+async def dispatch(request):
+    cmd = request.get("cmd")
+
+    if cmd == "speak":
+        return await speak(request)
+
+    if cmd == "stop":
+        await asyncio.get_running_loop().run_in_executor(None, Engine.stop)
+        return {}
+
+    if cmd == "warm":
+        voice, wpm, amplitude = get_params(request)
+        await asyncio.get_running_loop().run_in_executor(None, Engine.warm, voice, wpm, amplitude)
+        return {}
+
+    if cmd in ["phrases", "page"] and server_loop:
+        # The window this daemon runs in owns the phrases
+        raise ValueError(f"{cmd} is only taken by a daemon running on its own")
+
+    if cmd == "phrases":
+        # The window saves them, this only follows along
+        for n, text in request["changes"].items():
+            Settings.speech[int(n)] = str(text)
+
+        return {}
+
+    if cmd == "page":
+        name = str(request["name"])
+
+        if not Pages.is_valid(name):
+            raise ValueError(f"Bad page name: {name}")
+
+        try:
+            Settings.get_speech(Pages.get_path(name), follow=True)
+        except FileNotFoundError:
+            raise ValueError(f"No page called {name}")
+
+        return {}
+
+    if cmd == "list":
+        return {"phrases": Settings.speech[:Settings.get("num_items")]}
+
+    if cmd == "metrics":
+        return {"metrics": Metrics.summary()}
+
+    raise ValueError(f"Unknown command: {cmd}")
+
+async def respond(request, writer):
+    start = time.perf_counter()
+
+    try:
+        reply = dict(await dispatch(request), ok=True)
+    except Exception as e:
+        reply = {"ok": False, "error": str(e)}
+
+    reply["id"] = request.get("id")
+    # Whether this daemon runs on its own or inside a window
+    reply["standalone"] = server_loop is None
+    reply["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    try:
+        writer.write((json.dumps(reply) + "\n").encode())
+        await writer.drain()
+    except ConnectionError:
+        # The client went away
+        pass
+
+async def handle_client(reader, writer):
+    tasks = set()
+
+    try:
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = {"cmd": None}
+
+            # Each request runs on its own so a stop isn't held up by a speak
+            task = asyncio.create_task(respond(request, writer))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        writer.close()
+
+async def serve(on_ready=None):
+    filepath = get_socket_path()
+
+    # Left over from a daemon that didn't exit cleanly
+    filepath.unlink(missing_ok=True)
+
+    server = await asyncio.start_unix_server(handle_client, path=str(filepath))
+
+    if on_ready:
+        on_ready()
+
+    async with server:
+        await server.serve_forever()
+
+def start_thread():
+    """Run a daemon inside this process unless one is already running.
+
+    Returns once the socket accepts connections.
+    """
+    if is_running():
+        return
+
+    ready = threading.Event()
+
+    def run():
+        global server_loop
+
+        server_loop = asyncio.new_event_loop()
+        server_loop.run_until_complete(serve(ready.set))
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+def shutdown():
+    """Remove the socket of an in-process daemon"""
+    if server_loop:
+        get_socket_path().unlink(missing_ok=True)
+
+def main():
+    # The window saves the phrases, the daemon only reads them
+    Settings.setup(follow=True)
+    # The window may be writing metrics_file too
+    Metrics.start("daemon")
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        Engine.stop()
+        Mixer.shutdown()
+        get_socket_path().unlink(missing_ok=True)
+
+if __name__ == "__main__":
+    main()
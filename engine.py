@@ -0,0 +1,337 @@
+import threading
+import re
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from subprocess import Popen, PIPE
+
+import cache as Cache
+import metrics as Metrics
+import mixer as Mixer
+import worker as Worker
+import speechqueue as SpeechQueue
+import settings as Settings
+import supervisor as Supervisor
+
+# The speech engine, it doesn't touch Tk so the daemon can run without a window
+
+speech_lock = threading.Lock()
+current_speech_process = None
+speech_id = 0  # Bumped on every stop so stale threads don't start playback
+chunk_pool = None  # Renders the chunks of long texts in parallel
+chunk_jobs = []  # Pending chunk renders of the current utterance
+rendering = set()  # Synth processes rendering chunks
+
+def stop():
+    """Stop any currently running speech and drop what is queued"""
+    SpeechQueue.clear()
+    Mixer.clear()
+    interrupt()
+
+def interrupt():
+    """Stop the current utterance, queued ones still play"""
+    global current_speech_process, speech_id
+
+    with speech_lock:
+        speech_id += 1
+
+        # Drop chunks that haven't started and abort the ones rendering
+        for job in chunk_jobs:
+            job.cancel()
+
+        chunk_jobs.clear()
+
+        for process in rendering:
+            if process.poll() is None:
+                Supervisor.end(process)
+
+        rendering.clear()
+
+        if current_speech_process and current_speech_process.poll() is None:
+            # An idle worker has nothing to interrupt, keep it warm
+            if Worker.is_worker(current_speech_process) and not Worker.is_busy(current_speech_process):
+                return
+
+            # A worker cut off mid-utterance is replaced right away,
+            # anything else is left to the supervisor to reap
+            if not Worker.revive(current_speech_process):
+                Supervisor.end(current_speech_process)
+
+def track(process, my_id):
+    """Make process the current one so stop can reach it"""
+    global current_speech_process
+
+    with speech_lock:
+        current_speech_process = process
+
+        # Another utterance was requested while we were starting
+        if my_id != speech_id and not Worker.revive(process):
+            Supervisor.end(process)
+
+def watch(process, my_id):
+    """Keep track of a chunk render so stop can abort it"""
+    with speech_lock:
+        if my_id != speech_id:
+            Supervisor.end(process)
+            return
+
+        # Forget renders that are done
+        for done in [p for p in rendering if p.poll() is not None]:
+            rendering.discard(done)
+
+        rendering.add(process)
+
+def split_text(s, limit):
+    """Split text into sentences, and sentences longer than limit into clauses"""
+    chunks = []
+
+    for sentence in re.split(r"(?<=[.!?])\s+", s):
+        while len(sentence) > limit:
+            # Cut after the last clause break before the limit, else the last space
+            cut = max(sentence.rfind(mark, 0, limit) for mark in ",;:")
+
+            if cut <= 0:
+                cut = sentence.rfind(" ", 0, limit)
+
+            if cut <= 0:
+                cut = limit - 1
+
+            chunks.append(sentence[:cut + 1].strip())
+            sentence = sentence[cut + 1:]
+
+        if sentence.strip():
+            chunks.append(sentence.strip())
+
+    return chunks
+
+def speak_chunks(chunks, synth, v, wpm, amplitude, my_id, on_start):
+    """Render chunks in parallel and play each one as soon as it is ready"""
+    global chunk_pool
+
+    if not chunk_pool:
+        chunk_pool = ThreadPoolExecutor(max_workers=Settings.get("chunk_workers"))
+
+    def render(chunk):
+        filepath = Cache.lookup(synth, v, chunk)
+
+        if filepath:
+            return filepath
+
+        return Cache.render(synth, v, chunk, on_spawn=lambda process: watch(process, my_id))
+
+    with speech_lock:
+        # Stopped before we got going
+        if my_id != speech_id:
+            return
+
+        jobs = [chunk_pool.submit(render, chunk) for chunk in chunks]
+        chunk_jobs[:] = jobs
+
+    for job in jobs:
+        try:
+            filepath = job.result()
+        except CancelledError:
+            return
+
+        # Interrupted while rendering
+        if not filepath or my_id != speech_id:
+            return
+
+        process = play(filepath, wpm, amplitude)
+        track(process, my_id)
+
+        if job is jobs[0]:
+            on_start()
+
+        process.communicate()
+
+def play(filepath, wpm, amplitude):
+    """Start playing a clip at a speed and volume, returns the player process or the sink's playback"""
+    start = time.monotonic()
+    tempo = wpm / Cache.WPM
+    gain = amplitude / Cache.AMPLITUDE
+
+    if Settings.get("sink") or tempo != 1 or gain != 1:
+        # The sink has the audio device open already, and changing speed
+        # or volume means decoding the clip, which the sink plays from
+        process = Mixer.play(filepath, tempo, gain)
+        Metrics.record("speak_sink", start)
+        return process
+
+    process = Popen(shlex.split(Settings.get("player")) + [str(filepath)], stderr=PIPE)
+    Metrics.record("speak_spawn", start)
+    return process
+
+def get_wpm(speed):
+    """Convert a speed setting to words per minute for the synth (-s option)"""
+    # Default synth speed, what clips are rendered at
+    base_wpm = Cache.WPM
+
+    try:
+        return int(base_wpm * float(speed))
+    except (ValueError, TypeError):
+        # Default to normal speed if conversion fails
+        return base_wpm
+
+def get_amplitude(volume):
+    """Convert a volume setting to an amplitude percentage for the synth (-a option)"""
+    # Default is 100, our UI shows 0.1 to 1.0
+    try:
+        return int(float(volume) * 100)
+    except (ValueError, TypeError):
+        # Default to full volume if conversion fails
+        return 100
+
+def warm(v, wpm, amplitude):
+    """Start or restart the worker for a voice, speed and volume"""
+    if not Settings.get("worker"):
+        return
+
+    Worker.get(Settings.get("synth"), v, wpm, amplitude)
+
+def fill_cache(synth, v, s):
+    """Render a clip in the background so the next press is a cache hit"""
+    def run():
+        try:
+            Cache.render(synth, v, s)
+        except Exception as e:
+            print(f"Error filling cache: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+def run_thread(s, v, wpm, amplitude, my_id, on_start, on_error):
+    """Function to run in a separate thread for speaking"""
+    start = time.monotonic()
+
+    try:
+        synth = Settings.get("synth")
+
+        use_cache = Settings.get("cache_size") > 0
+        filepath = None
+
+        if use_cache:
+            filepath = Cache.lookup(synth, v, s)
+
+        if use_cache and not filepath and len(s) > Settings.get("chunk_length"):
+            # Long texts start playing after the first sentence is rendered
+            speak_chunks(split_text(s, Settings.get("chunk_length")), synth, v, wpm, amplitude, my_id, on_start)
+            return
+
+        if filepath:
+            # Cache hits skip synthesis and go straight to the player
+            process = play(filepath, wpm, amplitude)
+        elif Settings.get("worker"):
+            # The warm worker is already loaded, so this only costs a pipe write
+            write_start = time.monotonic()
+            process = Worker.speak(synth, v, wpm, amplitude, s)
+            Metrics.record("speak_worker_write", write_start)
+            track(process, my_id)
+            on_start()
+
+            if use_cache:
+                fill_cache(synth, v, s)
+
+            return
+        elif use_cache:
+            filepath = Cache.render(synth, v, s, on_spawn=lambda process: track(process, my_id))
+
+            # Rendering was interrupted
+            if not filepath:
+                return
+
+            process = play(filepath, wpm, amplitude)
+        else:
+            spawn_start = time.monotonic()
+            process = Popen([synth, "-v", v, "-s", str(wpm), "-a", str(amplitude), s], stderr=PIPE)
+            Metrics.record("speak_spawn", spawn_start)
+
+        track(process, my_id)
+        on_start()
+
+        # Wait for the process outside the lock to allow other threads to interrupt
+        _, error = process.communicate()
+        Metrics.record("speak_utterance", start)
+
+        if process.returncode != 0 and error:
+            raise RuntimeError(error.decode().strip())
+    except RuntimeError as e:
+        # Synth errors carry the synth's own message
+        print(f"Synth error: {e}")
+        on_error(f"Failed to speak: {e}")
+    except Exception as e:
+        print(e)
+        on_error("Failed to run synth")
+
+def speak(s, v, wpm, amplitude, on_start=None, on_error=None, on_end=None):
+    """Start speech in a separate thread, stopping any current speech first.
+
+    on_start is called once audio is on its way, on_error with a message
+    if it failed, and on_end when the thread is done either way.
+    """
+    start = time.monotonic()
+    stop()
+    my_id = speech_id
+
+    def started():
+        Metrics.record("speak_first_audio", start)
+
+        if on_start:
+            on_start()
+
+    def run():
+        try:
+            run_thread(s, v, wpm, amplitude, my_id, started, on_error or (lambda message: None))
+        finally:
+            if on_end:
+                on_end()
+
+    # Start a new thread for speaking
+    speech_thread = threading.Thread(target=run)
+    speech_thread.daemon = True  # Make thread exit when main program exits
+    speech_thread.start()
+
+def mix(s, v, wpm, amplitude, on_start=None, on_error=None, on_end=None):
+    """Play over whatever is playing instead of stopping it, through the mixer.
+
+    The callbacks work like the ones of speak.
+    """
+    def run():
+        try:
+            synth = Settings.get("synth")
+            filepath = Cache.lookup(synth, v, s)
+
+            if not filepath:
+                filepath = Cache.render(synth, v, s)
+
+            if filepath:
+                Mixer.add(filepath, wpm / Cache.WPM, amplitude / Cache.AMPLITUDE)
+
+                if on_start:
+                    on_start()
+        except RuntimeError as e:
+            print(f"Synth error: {e}")
+
+            if on_error:
+                on_error(f"Failed to speak: {e}")
+        except Exception as e:
+            print(e)
+
+            if on_error:
+                on_error("Failed to mix")
+        finally:
+            if on_end:
+                on_end()
+
+    threading.Thread(target=run, daemon=True).start()
+
+def enqueue(s, v, wpm, amplitude, now=False, priority="normal"):
+    """Queue speech instead of interrupting, or cut in front with now.
+
+    High priority speech plays before normal speech that is waiting.
+    """
+    item = (s, Settings.get("synth"), v, wpm, amplitude)
+
+    if now:
+        SpeechQueue.barge_in(item)
+    else:
+        SpeechQueue.add(item, SpeechQueue.PRIORITIES[priority])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Stand-in for espeak and aplay used by benchmark.py
+
+Every utterance appends the time it reached this process to the file
+named by FAKE_SYNTH_STAMP, which is how the benchmark measures
+Speak-to-process-start latency. Nothing is played.
+"""
+
+import time
+
+started = time.time()
+
+import os
+import sys
+import wave
+
+def stamp(when):
+    filepath = os.environ.get("FAKE_SYNTH_STAMP")
+
+    if filepath:
+        with open(filepath, "a") as file:
+            file.write(f"{when}\n")
+
+def write_wav(filepath, text):
+    """Write a short silent clip, roughly as long as text would take to say"""
+    with wave.open(filepath, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(22050)
+        clip.writeframes(b"\0\0" * 100 * max(len(text), 1))
+
+def main():
+    args = sys.argv[1:]
+
+    if any(arg.startswith("--voices") for arg in args):
+        print("Pty Language Age/Gender VoiceName          File          Other Languages")
+        print(" 5  en             M  default           default")
+        return
+
+    # Played back as a player, the last argument is the clip
+    if "--play" in args:
+        stamp(started)
+        return
+
+    options = {}
+    text = None
+    i = 0
+
+    while i < len(args):
+        if args[i] in ["-v", "-s", "-a", "-w"]:
+            options[args[i]] = args[i + 1]
+            i += 2
+        else:
+            text = args[i]
+            i += 1
+
+    if "-w" in options:
+        write_wav(options["-w"], text or "")
+        return
+
+    if text is not None:
+        stamp(started)
+        return
+
+    # No text, speak stdin line by line like espeak does
+    for line in sys.stdin:
+        stamp(time.time())
+
+if __name__ == "__main__":
+    main()
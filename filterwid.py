@@ -1,17 +1,21 @@
 import widgets as Widgets
 import tkinter as tk
+import time
 
-import inputs as Inputs
+import model as Model
 import settings as Settings
 import speech as Speech
+import search as Search
 import window as Window
+import metrics as Metrics
 
-indices = None  # Track which entries are currently filtered (shown)
 filter_var = None  # Variable for filter input
 filter_entry = None  # The filter entry widget
+pending = None  # Scheduled filter update, if any
+applied = None  # Filter text of the last update
 
 def setup(container):
-    global indices, filter_var, filter_entry
+    global filter_var, filter_entry
 
     # Add filter input above the speech entries
     filter_frame = Widgets.create_frame(container)
@@ -31,13 +35,18 @@ def setup(container):
 
     # Bind the filter entry to update filtering on text change
     def on_filter_change(*args):
-        # Get the current filter text
-        current_filter = filter_var.get()
-        apply(current_filter)
+        schedule()
 
     # Use both write and read traces to ensure it catches all changes
     filter_var.trace_add("write", on_filter_change)
 
+    # Moves change which phrases match
+    Model.subscribe(on_change)
+
+def on_change(event, *args):
+    if event == "swap":
+        apply()
+
 def clear():
     """Clear the filter and show all entries"""
     if filter_var:
@@ -48,11 +57,40 @@ def clear():
         if "filter_entry" in globals():
             filter_entry.focus_set()
 
+def schedule():
+    """Apply the filter once the event loop is idle.
+
+    Keystrokes that arrive before then are folded into the same update.
+    """
+    global pending
+
+    if pending is None:
+        pending = Window.window.after_idle(run_pending)
+
+def run_pending():
+    global pending
+
+    pending = None
+    apply(filter_var.get())
+
+def flush():
+    """Apply a scheduled update now, so what Enter acts on is up to date"""
+    if pending is not None:
+        run_pending()
+
 def apply(filter_text=""):
     """Filter the speech entries based on the given text"""
-    global indices
+    start = time.monotonic()
+    update(filter_text)
+    Metrics.record("filter", start)
+
+def update(filter_text):
+    global pending, applied
 
-    Inputs.scroll_to_top()
+    # Applying now supersedes any scheduled update
+    if pending is not None:
+        Window.window.after_cancel(pending)
+        pending = None
 
     if not filter_text:
         # Get current filter text if not provided
@@ -61,56 +99,31 @@ def apply(filter_text=""):
     # Ensure we have a clean starting point
     filter_text = filter_text.strip()
 
-    # Check if it's a number to filter by index
-    if filter_text.isdigit():
-        num = int(filter_text)
-
-        if num <= len(Inputs.entries):
-            entry = Inputs.entries[num - 1]
-            filter_text = entry.get().strip() if entry else ""
+    # Only jump back to the top when the query changed, not when
+    # the same filter is refreshed after a move
+    changed = filter_text != applied
+    applied = filter_text
 
-    # Make sure we have all the widgets we need
     num_items = Settings.get("num_items")
 
-    if len(Inputs.row_frames) != num_items or len(Inputs.entries) != num_items:
-        print(f"Warning: Widget count mismatch. Expected {num_items}, got {len(Inputs.row_frames)} row frames, "
-              f"{len(Inputs.entries)} entries")
+    # Check if it's a number to filter by index
+    if filter_text.isdigit():
+        num = int(filter_text)
 
-        return
+        if 0 < num <= num_items:
+            filter_text = Settings.speech[num - 1].strip()
 
     # If no filter text, show all entries
     if not filter_text:
-        indices = None
-
-        # Show all entry rows
-        for n in range(num_items):
-            # Use grid with the correct row to restore position
-            Inputs.row_frames[n].grid(row=n, column=0, sticky="ew", padx=0, pady=1)
-
+        Model.set_view(None, changed)
         return
 
-    # Convert filter to lowercase for case-insensitive comparison
-    filter_text = filter_text.lower()
-
-    # Create a list to store indices of entries that match the filter
-    indices = []
-
-    # Counter for visible rows to ensure compact display
-    visible_row = 0
-
-    # Check each entry against the filter
-    for n in range(num_items):
-        if n < len(Inputs.entries):
-            entry_text = Inputs.entries[n].get().lower()
-
-            if filter_text in entry_text:
-                indices.append(n)
-                # Show this entry row and reposition it to be compact
-                Inputs.row_frames[n].grid(row=visible_row, column=0, sticky="ew", padx=0, pady=1)
-                visible_row += 1
-            else:
-                # Completely remove this entry from the grid
-                Inputs.row_frames[n].grid_forget()
+    # Indices of the phrases that match the filter, the list shows only these
+    if Settings.get("filter_mode") == "fuzzy":
+        # Best match first so Enter speaks it
+        Model.set_view(Search.fuzzy(filter_text, Settings.get("fuzzy_results")), changed)
+    else:
+        Model.set_view(Search.query(filter_text), changed)
 
 def focus():
     """Focus the filter entry."""
@@ -118,15 +131,19 @@ def focus():
 
 def reset():
     # Make sure all entries are visible before saving
-    if indices is not None:
+    if Model.filtered:
         filter_var.set("")
         apply("")  # This will restore all items in their proper grid positions
 
 def on_enter():
-    if not focused:
+    # Keystrokes and Return can arrive in one batch, before the idle update
+    flush()
+
+    if not focused():
         return False
 
-    if indices and (not len(indices)):
+    # Nothing matches, say what was typed
+    if Model.filtered and not Model.view:
         Speech.callback(None, filter_entry)
         return True
 
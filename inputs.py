@@ -3,17 +3,24 @@ from tkinter import ttk
 
 import widgets as Widgets
 import settings as Settings
-import filterwid as Filter
 import speech as Speech
+import model as Model
 import window as Window
 
+# Rows are a fixed pool sized to the viewport, each one is bound
+# to a phrase index and rebound as the list scrolls
 entries = []
 row_frames = []  # Store references to row frames containing all elements
-canvas = None
+entry_vars = []  # Text variables of the pooled entries
+bound = []  # Phrase index shown by each pooled row, None if unused
+offset = 0  # Position in Model.view of the first pooled row
+row_height = 0
+rendering = False  # Set while rows are rebound so edits aren't recorded
+scrollbar = None
 frame = None  # The frame containing the input entries
 
 def setup():
-    global frame, row_frames, canvas
+    global frame, scrollbar, row_height
 
     # Main window
     window = Window.window
@@ -22,158 +29,241 @@ def setup():
     main_container = Widgets.create_frame(window)
     main_container.pack(fill="both", expand=True, padx=10, pady=5)
 
-    # Create canvas with scrollbar for scrolling through items
-    canvas = tk.Canvas(main_container, bg="#2d2d2d", highlightthickness=0)
-    scrollbar = ttk.Scrollbar(main_container, orient="vertical", command=canvas.yview)
-
     # Use the global frame variable
-    frame = Widgets.create_frame(canvas)
+    frame = Widgets.create_frame(main_container)
+    scrollbar = ttk.Scrollbar(main_container, orient="vertical", command=on_scrollbar)
 
-    # Configure scrolling
-    canvas.configure(yscrollcommand=scrollbar.set)
-    canvas.pack(side="left", fill="both", expand=True)
+    frame.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
 
-    # Create a window inside the canvas for the frame
-    canvas_frame = canvas.create_window((0, 0), window=frame, anchor="nw")
+    # Make the row frames expand horizontally
+    frame.grid_columnconfigure(0, weight=1)
+
+    # Create one row to measure how tall rows are
+    create_row()
+    row_frames[0].update_idletasks()
+    row_height = row_frames[0].winfo_reqheight() + 2  # Plus the grid padding
 
-    # Configure the canvas to resize with the frame
-    def configure_canvas(event):
-        canvas.configure(scrollregion=canvas.bbox("all"))
-        canvas.itemconfig(canvas_frame, width=event.width)
+    # Grow the pool when the window gets taller
+    frame.bind("<Configure>", lambda e: resize(e.height))
 
-    frame.bind("<Configure>", configure_canvas)
-    canvas.bind("<Configure>", lambda e: canvas.itemconfig(canvas_frame, width=e.width))
+    def over_combobox(event):
+        # Don't scroll the list if over a combobox
+        widget = window.winfo_containing(event.x_root, event.y_root)
+        return isinstance(widget, ttk.Combobox) or "TCombobox" in str(widget)
 
     # Add mouse wheel scrolling
     def on_mousewheel(event):
         try:
-            # Check if the mousewheel event is over a combobox
-            widget = window.winfo_containing(event.x_root, event.y_root)
-            if isinstance(widget, ttk.Combobox) or "TCombobox" in str(widget):
-                return  # Don't scroll the canvas if over a combobox
-            canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+            if over_combobox(event):
+                return
+
+            scroll(int(-1 * (event.delta / 120)))
         except KeyError:
             # Skip scrolling when dropdown is active
             pass
 
-    canvas.bind_all("<MouseWheel>", on_mousewheel)  # Windows and MacOS
+    frame.bind_all("<MouseWheel>", on_mousewheel)  # Windows and MacOS
 
     # Filter for Linux scrolling events too
     def on_scroll_up(event):
         try:
-            widget = window.winfo_containing(event.x_root, event.y_root)
-
-            if isinstance(widget, ttk.Combobox) or "TCombobox" in str(widget):
+            if over_combobox(event):
                 return
 
-            canvas.yview_scroll(-1, "units")
+            scroll(-1)
         except KeyError:
             # Skip scrolling when dropdown is active
             pass
 
     def on_scroll_down(event):
         try:
-            widget = window.winfo_containing(event.x_root, event.y_root)
-
-            if isinstance(widget, ttk.Combobox) or "TCombobox" in str(widget):
+            if over_combobox(event):
                 return
 
-            canvas.yview_scroll(1, "units")
+            scroll(1)
         except KeyError:
             # Skip scrolling when dropdown is active
             pass
 
-    canvas.bind_all("<Button-4>", on_scroll_up)  # Linux
-    canvas.bind_all("<Button-5>", on_scroll_down)   # Linux
+    frame.bind_all("<Button-4>", on_scroll_up)  # Linux
+    frame.bind_all("<Button-5>", on_scroll_down)   # Linux
 
-    # Clear any previous references
-    row_frames = []
+    Model.subscribe(on_change)
+    Model.set_view(None)
+    resize(Settings.get("height"))
 
-    for n in range(Settings.get("num_items")):
-        # Create a frame for this row
-        row_frame = Widgets.create_frame(frame)
-        row_frame.grid(row=n, column=0, sticky="ew", padx=0, pady=1)
-        row_frames.append(row_frame)
+def create_row():
+    """Add a row to the pool, it gets bound to a phrase by render"""
+    k = len(row_frames)
 
-        create_speak(row_frame, n)
-        create_entry(row_frame, Settings.speech[n])
-        create_buttons(row_frame, n)
+    # Create a frame for this row
+    row_frame = Widgets.create_frame(frame)
+    row_frames.append(row_frame)
+    bound.append(None)
 
-    # Make the row frames expand horizontally
-    frame.grid_columnconfigure(0, weight=1)
+    create_speak(row_frame, k)
+    create_entry(row_frame, k)
+    create_buttons(row_frame, k)
 
-def create_speak(container, n):
+def create_speak(container, k):
         # Add the speak button
-        btn = Widgets.create_button(container, "Speak", lambda n=n: Speech.callback(n))
+        btn = Widgets.create_button(container, "Speak", lambda k=k: Speech.callback(bound[k]))
         btn.pack(side="left", padx=(0, 5), pady=2)
 
-def create_entry(container, speech):
+def create_entry(container, k):
     global entries
 
+    var = tk.StringVar()
+    var.trace_add("write", lambda *args, k=k: on_edit(k))
+
     entry = Widgets.create_entry(container)
-    entry.insert(0, speech)
+    entry.configure(textvariable=var)
     entry.pack(side="left", padx=0, pady=2, fill="x", expand=True)
     entries.append(entry)
+    Model.add_row(entry, k)
+    entry_vars.append(var)
     return entry
 
-def create_buttons(container, n):
+def create_buttons(container, k):
     # Button container for up/down buttons
     button_container = Widgets.create_frame(container)
     button_container.pack(side="right", padx=5)
 
     # Up button
-    up_btn = Widgets.create_button(button_container, "▲", lambda n=n: move_item_up(n))
+    up_btn = Widgets.create_button(button_container, "▲", lambda k=k: move_item_up(bound[k]))
     up_btn.pack(side="left", padx=(2, 0))
 
     # Down button
-    down_btn = Widgets.create_button(button_container, "▼", lambda n=n: move_item_down(n))
+    down_btn = Widgets.create_button(button_container, "▼", lambda k=k: move_item_down(bound[k]))
     down_btn.pack(side="left", padx=(0, 5))
 
-def scroll_to_top():
-    """Scroll the canvas to the top position."""
-    # Make sure the canvas exists before trying to scroll
-    if "canvas" in globals():
-        canvas.yview_moveto(0.0)  # Move view to the beginning (0.0 = top)
+def on_edit(k):
+    """Write an edited entry through to the phrase it is bound to"""
+    if rendering or bound[k] is None:
+        return
 
-def move_item_up(index):
-    Settings.save_speech()
+    Model.set_text(bound[k], entry_vars[k].get())
 
-    """Move a speech item up in the list (swap with the item above it)"""
-    if index <= 0:
-        return  # Can't move the first item up
+def on_change(event, *args):
+    global offset
 
-    # Swap entries in the speech list
-    Settings.speech[index], Settings.speech[index-1] = Settings.speech[index-1], Settings.speech[index]
+    if event == "view":
+        if args[0]:
+            offset = 0
 
-    # Update the text in the entries
-    entries[index].delete(0, tk.END)
-    entries[index].insert(0, Settings.speech[index])
+        # Rows keep their binding when the phrase under them is the same,
+        # so only rows that entered, left or changed get touched
+        render()
+    elif event == "swap":
+        render()
 
-    entries[index-1].delete(0, tk.END)
-    entries[index-1].insert(0, Settings.speech[index-1])
+def get_page_size():
+    """Number of rows that fit in the viewport"""
+    return max(1, frame.winfo_height() // row_height) if frame.winfo_ismapped() else len(row_frames)
 
-    # Save the updated order
-    Settings.save_speech()
-    Filter.apply()
+def resize(height):
+    """Make sure the pool has enough rows to fill height"""
+    needed = height // row_height + 1
 
-def move_item_down(index):
-    Settings.save_speech()
+    while len(row_frames) < needed:
+        create_row()
 
-    """Move a speech item down in the list (swap with the item below it)"""
-    if index >= len(Settings.speech) - 1:
-        return  # Can't move the last item down
+    render()
+
+def render():
+    """Bind the pooled rows to the phrases at the current scroll offset"""
+    global rendering, offset
+
+    view = Model.view
+    # Keep the offset in range after the view or window changed
+    offset = max(0, min(offset, len(view) - get_page_size()))
+    rendering = True
+
+    try:
+        for k in range(len(row_frames)):
+            pos = offset + k
+
+            if pos < len(view):
+                n = view[pos]
+
+                if bound[k] != n or entry_vars[k].get() != Settings.speech[n]:
+                    entry_vars[k].set(Settings.speech[n])
 
-    # Swap entries in the speech list
-    Settings.speech[index], Settings.speech[index+1] = Settings.speech[index+1], Settings.speech[index]
+                if bound[k] is None:
+                    row_frames[k].grid(row=k, column=0, sticky="ew", padx=0, pady=1)
 
-    # Update the text in the entries
-    entries[index].delete(0, tk.END)
-    entries[index].insert(0, Settings.speech[index])
+                bound[k] = n
+            elif bound[k] is not None:
+                bound[k] = None
+                row_frames[k].grid_forget()
+    finally:
+        rendering = False
 
-    entries[index+1].delete(0, tk.END)
-    entries[index+1].insert(0, Settings.speech[index+1])
+    if view:
+        scrollbar.set(offset / len(view), min(1.0, (offset + get_page_size()) / len(view)))
+    else:
+        scrollbar.set(0.0, 1.0)
+
+def scroll(rows):
+    global offset
+
+    offset += rows
+    render()
+
+def on_scrollbar(*args):
+    global offset
+
+    if args[0] == "moveto":
+        offset = int(float(args[1]) * len(Model.view))
+    elif args[0] == "scroll":
+        step = get_page_size() if args[2] == "pages" else 1
+        offset += int(args[1]) * step
+
+    render()
+
+def scroll_to_top():
+    """Scroll the list to the top position."""
+    global offset
+
+    # Make sure the list exists before trying to scroll
+    if frame:
+        offset = 0
+        render()
+
+def get_position(entry):
+    """Return the position in the view of a pooled entry"""
+    return offset + Model.get_row(entry)
+
+def focus_position(pos):
+    """Scroll the view position into sight and focus its entry"""
+    global offset
+
+    if pos < 0 or pos >= len(Model.view):
+        return
+
+    page_size = get_page_size()
+
+    if pos < offset:
+        offset = pos
+    elif pos >= offset + page_size:
+        offset = pos - page_size + 1
+
+    render()
+    entries[pos - offset].focus_set()
+
+def move_item_up(index):
+    """Move a speech item up in the list (swap with the item above it)"""
+    if index is None or index <= 0:
+        return  # Can't move the first item up
+
+    # Swap entries in the speech list, only the swap is journaled, not the whole list
+    Model.swap(index, index-1)
+
+def move_item_down(index):
+    """Move a speech item down in the list (swap with the item below it)"""
+    if index is None or index >= len(Settings.speech) - 1:
+        return  # Can't move the last item down
 
-    # Save the updated order
-    Settings.save_speech()
-    Filter.apply()
\ No newline at end of file
+    # Swap entries in the speech list, only the swap is journaled, not the whole list
+    Model.swap(index, index+1)
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import settings as Settings
+import store as Store
+
+# Latency of the steps between a key press and the first sound, kept as
+# rolling windows of recent samples and written out every metrics_interval
+# seconds to metrics_file, as a Prometheus textfile if it ends in .prom
+# and as JSON otherwise. Timers are monotonic.
+
+WINDOW = 1000  # Recent samples kept per metric
+QUANTILES = [0.5, 0.95, 0.99]
+
+metrics_lock = threading.Lock()
+samples = {}  # Recent durations in seconds by metric name
+totals = {}  # [count, sum] over the whole run by metric name
+gauges = {}  # Current values of things that aren't timings, by name
+dumper = None
+
+def record(name, start):
+    """Record the time since start, a time.monotonic() reading"""
+    seconds = time.monotonic() - start
+
+    with metrics_lock:
+        if name not in samples:
+            samples[name] = deque(maxlen=WINDOW)
+            totals[name] = [0, 0.0]
+
+        samples[name].append(seconds)
+        totals[name][0] += 1
+        totals[name][1] += seconds
+
+def set_gauge(name, value):
+    with metrics_lock:
+        gauges[name] = value
+
+def get_gauges():
+    with metrics_lock:
+        return dict(sorted(gauges.items()))
+
+def snapshot():
+    """Sorted recent samples and run totals by metric name"""
+    with metrics_lock:
+        return {name: (sorted(window), list(totals[name])) for name, window in samples.items()}
+
+def get_quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def summary():
+    """Quantiles of the recent samples in milliseconds, with run totals"""
+    result = {}
+
+    for name, (ordered, (count, seconds)) in sorted(snapshot().items()):
+        result[name] = {
+            "count": count,
+            "sum_ms": round(seconds * 1000, 3),
+            "p50": round(get_quantile(ordered, 0.5) * 1000, 3),
+            "p95": round(get_quantile(ordered, 0.95) * 1000, 3),
+            "p99": round(get_quantile(ordered, 0.99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3),
+        }
+
+    return result
+
+def to_prometheus():
+    lines = ["# HELP strudel_latency_seconds Time taken by each step, over recent samples",
+             "# TYPE strudel_latency_seconds summary"]
+
+    for name, (ordered, (count, seconds)) in sorted(snapshot().items()):
+        for q in QUANTILES:
+            lines.append(f'strudel_latency_seconds{{step="{name}",quantile="{q}"}} {get_quantile(ordered, q):.6f}')
+
+        lines.append(f'strudel_latency_seconds_sum{{step="{name}"}} {seconds:.6f}')
+        lines.append(f'strudel_latency_seconds_count{{step="{name}"}} {count}')
+
+    for name, value in get_gauges().items():
+        lines.append(f"# TYPE strudel_{name} gauge")
+        lines.append(f"strudel_{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+def get_metrics_path(suffix=""):
+    """Where metrics_file points, suffix keeps a separate daemon from overwriting the window's"""
+    filepath = Path(Settings.get("metrics_file"))
+
+    if not filepath.is_absolute():
+        filepath = Path(__file__).parent.resolve() / filepath
+
+    if suffix:
+        filepath = filepath.with_name(f"{filepath.stem}.{suffix}{filepath.suffix}")
+
+    return filepath
+
+def dump(suffix=""):
+    """Write the metrics file now"""
+    filepath = get_metrics_path(suffix)
+
+    if filepath.suffix == ".prom":
+        text = to_prometheus()
+    else:
+        text = json.dumps({"time": time.time(), "metrics": summary(), "gauges": get_gauges()}, indent=2)
+
+    Store.write_atomic(filepath, text)
+
+def start(suffix=""):
+    """Dump the metrics periodically, if metrics_file is set"""
+    global dumper
+
+    if dumper or not Settings.get("metrics_file"):
+        return
+
+    def run():
+        while True:
+            time.sleep(max(Settings.get("metrics_interval"), 1))
+
+            try:
+                dump(suffix)
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+
+    dumper = threading.Thread(target=run, daemon=True)
+    dumper.start()
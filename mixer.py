@@ -0,0 +1,322 @@
+import array
+import shlex
+import sys
+import threading
+import time
+import wave
+from subprocess import Popen, PIPE
+
+import settings as Settings
+import supervisor as Supervisor
+
+# NumPy makes mixing cheaper but isn't required
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Clips are decoded and summed in this process and written as raw PCM to
+# one long running player, the sink, which keeps the audio device open.
+# A short sound can play over a longer line, and with sink=true every
+# clip plays this way instead of through a player process of its own.
+
+RATE = 22050  # Samples per second, what espeak writes
+BLOCK = 256  # Samples mixed at a time, about 12ms
+LEAD = 0.02  # Seconds of audio written ahead, what is still heard after a stop
+FRAME = 512  # Samples per piece when changing tempo, about 23ms
+SEEK = 96  # How far a piece may shift to line up with the one before it
+
+cond = threading.Condition()
+voices = []  # Playback of each clip that is playing
+sink = None  # The player, reading PCM from stdin
+mixer = None
+clock = 0  # When everything written so far will have been played
+flushes = 0  # Bumped on a stop, so blocks mixed before it aren't written
+
+class Playback:
+    """A clip playing through the sink, it can be stopped and waited
+    for like a player process"""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.position = 0  # Next sample to mix
+        self.returncode = None
+        self.done = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        stop(self)
+
+    def kill(self):
+        stop(self)
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.returncode
+
+    def communicate(self):
+        self.wait()
+        return None, b""
+
+    def finish(self, returncode):
+        self.returncode = returncode
+        self.done.set()
+
+def decode(filepath):
+    """Read a wav clip as mono 16 bit samples at RATE"""
+    with wave.open(str(filepath), "rb") as clip:
+        if clip.getsampwidth() != 2:
+            raise RuntimeError("Only 16 bit clips can be mixed")
+
+        channels = clip.getnchannels()
+        rate = clip.getframerate()
+        data = clip.readframes(clip.getnframes())
+
+    if numpy:
+        samples = numpy.frombuffer(data, dtype="<i2").astype(numpy.int32)
+
+        if channels > 1:
+            samples = samples[:len(samples) // channels * channels]
+            samples = samples.reshape(-1, channels).mean(axis=1).astype(numpy.int32)
+
+        if rate != RATE:
+            # Nearest sample is good enough for speech
+            samples = samples[numpy.arange(len(samples) * RATE // rate) * rate // RATE]
+
+        return samples
+
+    samples = array.array("h", data)
+
+    # Wav is little endian
+    if sys.byteorder == "big":
+        samples.byteswap()
+
+    if channels > 1:
+        samples = array.array("h", (sum(samples[i:i + channels]) // channels
+                                    for i in range(0, len(samples) - channels + 1, channels)))
+
+    if rate != RATE:
+        samples = array.array("h", (samples[i * rate // RATE]
+                                    for i in range(len(samples) * RATE // rate)))
+
+    return samples
+
+def stretch(samples, tempo):
+    """Play samples tempo times as fast without changing their pitch.
+
+    Pieces of the clip are taken at tempo times the rate they are laid
+    down and overlapped, each shifted a little to where it best matches
+    what it overlaps so the voice doesn't go rough (WSOLA).
+    """
+    hop = FRAME // 2
+
+    if tempo == 1 or len(samples) < FRAME * 2:
+        return samples
+
+    count = int((len(samples) - FRAME - SEEK) / (hop * tempo))
+
+    if not numpy:
+        # Without NumPy the pieces aren't shifted to match, searching
+        # costs too much here, but each still fades into the next
+        out = array.array("h", samples[:hop])
+        weights = [i / hop for i in range(hop)]
+        last = 0
+
+        for k in range(1, count):
+            start = int(k * hop * tempo)
+            tail = samples[last + hop:last + FRAME]
+            head = samples[start:start + hop]
+            out.extend(int(a + (b - a) * w) for a, b, w in zip(tail, head, weights))
+            last = start
+
+        return out
+
+    samples = samples.astype(numpy.float64)
+    # Halves of a periodic Hann window add up to one
+    window = numpy.hanning(FRAME + 1)[:-1]
+    out = numpy.zeros(count * hop + FRAME)
+    start = 0
+
+    for k in range(count):
+        out[k * hop:k * hop + FRAME] += samples[start:start + FRAME] * window
+
+        # What would have followed this piece, the next one should sound like it
+        follow = samples[start + hop:start + hop + hop]
+        low = max(int((k + 1) * hop * tempo) - SEEK, 0)
+        region = samples[low:low + 2 * SEEK + hop]
+        start = low + int(numpy.argmax(numpy.correlate(region, follow, "valid")))
+
+    return out[:count * hop].astype(numpy.int32)
+
+def scale(samples, gain):
+    """Samples at gain times their amplitude"""
+    if gain == 1:
+        return samples
+
+    if numpy:
+        return (samples * gain).astype(numpy.int32)
+
+    return array.array("h", (min(max(int(sample * gain), -32768), 32767) for sample in samples))
+
+def mix():
+    """Sum the next block of every voice, clipped to 16 bits"""
+    if numpy:
+        block = numpy.zeros(BLOCK, dtype=numpy.int32)
+
+        for voice in voices:
+            part = voice.samples[voice.position:voice.position + BLOCK]
+            block[:len(part)] += part
+            voice.position += BLOCK
+
+        return numpy.clip(block, -32768, 32767).astype("<i2").tobytes()
+
+    block = [0] * BLOCK
+
+    for voice in voices:
+        for i, sample in enumerate(voice.samples[voice.position:voice.position + BLOCK]):
+            block[i] += sample
+
+        voice.position += BLOCK
+
+    block = array.array("h", (min(max(sample, -32768), 32767) for sample in block))
+
+    if sys.byteorder == "big":
+        block.byteswap()
+
+    return block.tobytes()
+
+def open_sink():
+    """Start the sink if it isn't running, returns it"""
+    global sink
+
+    with cond:
+        if not sink or sink.poll() is not None:
+            sink = Popen(shlex.split(Settings.get("sink_player")), stdin=PIPE)
+
+        return sink
+
+def write(data, my_flushes):
+    """Write PCM to the sink, starting it if needed"""
+    global sink
+
+    with cond:
+        # Stopped since the block was mixed
+        if my_flushes != flushes:
+            return
+
+        process = open_sink()
+
+    try:
+        process.stdin.write(data)
+        process.stdin.flush()
+    except OSError as e:
+        with cond:
+            # Shut down while writing
+            if process is not sink:
+                return
+
+            print(f"Error writing to the sink: {e}")
+            Supervisor.end(sink)
+            sink = None
+
+        clear()
+
+def run():
+    global clock
+
+    while True:
+        with cond:
+            while not voices:
+                cond.wait()
+
+            data = mix()
+            my_flushes = flushes
+
+            for voice in voices:
+                if voice.position >= len(voice.samples):
+                    voice.finish(0)
+
+            voices[:] = [voice for voice in voices if voice.returncode is None]
+
+        now = time.monotonic()
+
+        if clock < now:
+            clock = now
+
+        # The player would take as much as the pipe holds, stay just
+        # ahead of it so a stop is heard right away
+        if clock - now > LEAD:
+            time.sleep(clock - now - LEAD)
+
+        write(data, my_flushes)
+        clock += BLOCK / RATE
+
+def play(filepath, tempo=1, gain=1):
+    """Start a clip at tempo times its speed and gain times its volume, returns its Playback"""
+    global mixer
+
+    playback = Playback(scale(stretch(decode(filepath), tempo), gain))
+
+    with cond:
+        voices.append(playback)
+
+        if not mixer:
+            mixer = threading.Thread(target=run, daemon=True)
+            mixer.start()
+
+        cond.notify()
+
+    return playback
+
+def add(filepath, tempo=1, gain=1):
+    """Play a clip over whatever is playing, the oldest clip makes room if needed"""
+    with cond:
+        limit = max(Settings.get("mix_voices"), 1)
+
+        while len(voices) >= limit:
+            voices.pop(0).finish(-15)
+
+    return play(filepath, tempo, gain)
+
+def stop(playback):
+    """Stop a clip, the sink keeps playing what it already has"""
+    with cond:
+        if playback.returncode is not None:
+            return
+
+        voices.remove(playback)
+        playback.finish(-15)
+
+        if not voices:
+            flush()
+
+def flush():
+    """Drop audio that was mixed but not written yet.
+
+    The sink is never more than LEAD ahead, so what it holds is left to
+    play out rather than reopening the audio device.
+    """
+    global flushes
+
+    with cond:
+        flushes += 1
+
+def clear():
+    """Stop every clip at once"""
+    with cond:
+        for voice in voices:
+            voice.finish(-15)
+
+        voices.clear()
+        flush()
+
+def shutdown():
+    global sink
+
+    clear()
+
+    if sink:
+        Supervisor.end(sink)
+        sink = None
@@ -0,0 +1,62 @@
+import settings as Settings
+import search as Search
+import store as Store
+
+# The phrases as the list shows them: which ones are visible and in what
+# order, which pooled entry widget is which row, and listeners that are
+# told about changes. Row lookups are constant time so navigation doesn't
+# slow down with the size of the list.
+
+view = []  # Phrase indices in display order, all of them or the filtered ones
+filtered = False  # Whether view is the result of a filter
+rows = {}  # Pooled row number by entry widget
+listeners = []
+
+def subscribe(callback):
+    """Call callback(event, *args) on changes.
+
+    Events are ("view", scroll_top) when the visible phrases changed,
+    ("edit", n) when phrase n was edited and ("swap", i, j) when two
+    phrases traded places.
+    """
+    listeners.append(callback)
+
+def notify(event, *args):
+    for callback in listeners:
+        callback(event, *args)
+
+def set_view(indices, scroll_top=False):
+    """Show only the given phrase indices, in order, or all of them if None"""
+    global view, filtered
+
+    filtered = indices is not None
+    view = list(range(Settings.get("num_items")) if indices is None else indices)
+    notify("view", scroll_top)
+
+def get_first():
+    """The first visible phrase with text, None if there is none"""
+    for n in view:
+        if Settings.speech[n].strip():
+            return n
+
+    return None
+
+def add_row(entry, k):
+    rows[entry] = k
+
+def get_row(widget):
+    """Pooled row number of an entry widget, None for other widgets"""
+    return rows.get(widget)
+
+def set_text(n, text):
+    """Change the text of phrase n"""
+    Store.set(n, text)
+    Search.update(n, Settings.speech[n])
+    notify("edit", n)
+
+def swap(i, j):
+    """Trade the places of phrases i and j"""
+    Store.swap(i, j)
+    Search.update(i, Settings.speech[i])
+    Search.update(j, Settings.speech[j])
+    notify("swap", i, j)
@@ -0,0 +1,57 @@
+import tkinter as tk
+
+import metrics as Metrics
+import settings as Settings
+import window as Window
+
+# Recent latencies drawn over the top of the window, F2 toggles it
+
+REFRESH = 1000  # Milliseconds between updates
+
+label = None
+pending = None  # Scheduled refresh, if any
+
+def setup():
+    if Settings.get("metrics_overlay"):
+        show()
+
+def toggle():
+    """Show or hide the overlay and remember the choice"""
+    if label:
+        hide()
+    else:
+        show()
+
+    Settings.set("metrics_overlay", label is not None)
+
+def show():
+    global label
+
+    label = tk.Label(Window.window, font=("monospace", 9), justify="left",
+                     bg="#000000", fg="#7fff7f", padx=5, pady=5)
+    label.place(relx=1.0, x=-5, y=5, anchor="ne")
+    refresh()
+
+def hide():
+    global label, pending
+
+    if pending is not None:
+        Window.window.after_cancel(pending)
+        pending = None
+
+    label.destroy()
+    label = None
+
+def refresh():
+    global pending
+
+    lines = [f"{'ms':<20}{'p50':>8}{'p95':>8}{'p99':>8}{'count':>7}"]
+
+    for name, stats in Metrics.summary().items():
+        lines.append(f"{name:<20}{stats['p50']:>8.1f}{stats['p95']:>8.1f}{stats['p99']:>8.1f}{stats['count']:>7}")
+
+    for name, value in Metrics.get_gauges().items():
+        lines.append(f"{name:<28}{value:>23}")
+
+    label.configure(text="\n".join(lines))
+    pending = Window.window.after(REFRESH, refresh)
@@ -0,0 +1,174 @@
+import re
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from pathlib import Path
+
+import autosave as Autosave
+import filterwid as Filter
+import inputs as Inputs
+import search as Search
+import settings as Settings
+import store as Store
+import widgets as Widgets
+import window as Window
+
+# Each phrasebook is a page with its own file, speech.txt is the page
+# called "speech" and the others live in pages/. Only the active page is
+# loaded. Pages that were switched away from keep their phrases and
+# search index in memory, so switching back is instant, and the list
+# rows are shared by all pages, a switch only rebinds them. A page that
+# isn't in memory is read on a thread, and changes still queued for the
+# page being left are written by the autosave writer, so a switch never
+# waits on the disk.
+
+DEFAULT = "speech"
+STORE_STATE = ["phrases", "snapshot_path", "journal_lines"]
+SEARCH_STATE = ["texts", "grams", "pairs", "pair_counts", "last_query", "last_results", "source", "dirty"]
+
+recent = OrderedDict()  # Inactive pages in memory by name, least recently used first
+loading = None  # Page being read in the background, a later switch replaces it
+page_var = None
+page_combo = None
+
+def get_pages_path():
+    thispath = Path(__file__).parent.resolve()
+    filepath = Path(thispath) / "pages"
+    return filepath
+
+def get_path(name):
+    if name == DEFAULT:
+        return Settings.get_speech_path()
+
+    dirpath = get_pages_path()
+    dirpath.mkdir(exist_ok=True)
+    return dirpath / f"{name}.txt"
+
+def get_names():
+    names = [DEFAULT]
+
+    if get_pages_path().is_dir():
+        names.extend(sorted(filepath.stem for filepath in get_pages_path().glob("*.txt")))
+
+    return names
+
+def is_valid(name):
+    return bool(re.fullmatch(r"[\w -]+", name))
+
+def get_state():
+    """What the store and the search index hold for the active page"""
+    with Store.store_lock, Search.search_lock:
+        return ({key: getattr(Store, key) for key in STORE_STATE},
+                {key: getattr(Search, key) for key in SEARCH_STATE})
+
+def set_state(state):
+    store_state, search_state = state
+
+    with Store.store_lock:
+        for key, value in store_state.items():
+            setattr(Store, key, value)
+
+    # A page read in the background hasn't been indexed yet
+    if search_state is None:
+        Search.build(Store.phrases, Settings.get("num_items"))
+        return
+
+    with Search.search_lock:
+        for key, value in search_state.items():
+            setattr(Search, key, value)
+
+def switch(name):
+    """Make name the active page, reading it in the background if it isn't in memory"""
+    global loading
+
+    loading = None
+
+    if name == Settings.get("page"):
+        return
+
+    state = recent.pop(name, None)
+
+    if state:
+        activate(name, state)
+        return
+
+    loading = name
+    num_items = Settings.get("num_items")
+    default = Settings.get("default_text")
+
+    def run():
+        try:
+            state = (Store.open_page(get_path(name), num_items, default), None)
+        except Exception as e:
+            print(f"Error loading page {name}: {e}")
+            state = None
+
+        # Back on the main thread
+        Window.window.after(0, lambda: finish(name, state))
+
+    threading.Thread(target=run, daemon=True).start()
+
+def finish(name, state):
+    global loading
+
+    # Another switch came after this one
+    if loading != name:
+        return
+
+    loading = None
+
+    if state:
+        activate(name, state)
+    else:
+        page_var.set(Settings.get("page"))
+
+def activate(name, state):
+    """Put the active page away and bring in name"""
+    # Its queued changes go to its journal when the writer gets to them
+    if Store.put_away():
+        Autosave.mark("phrases")
+
+    recent[Settings.get("page")] = get_state()
+    set_state(state)
+
+    while len(recent) > Settings.get("page_cache"):
+        recent.popitem(last=False)
+
+    Settings.speech = Store.phrases
+    Settings.set("page", name)
+    page_var.set(name)
+    page_combo.configure(values=get_names())
+    Filter.clear()
+    Inputs.scroll_to_top()
+
+def setup(container):
+    global page_var, page_combo
+
+    # Page selection with label
+    page_frame = Widgets.create_frame(container)
+    page_frame.pack(side="left", padx=Widgets.PAD_X)
+
+    page_label = Widgets.create_label(page_frame, "Page:")
+    page_label.pack(side="top", pady=(0, 2))
+
+    page_var = tk.StringVar(value=Settings.get("page"))
+
+    page_combo = Widgets.create_combobox(page_frame, page_var, get_names())
+    page_combo.pack(side="top")
+
+    def on_select(event=None):
+        # Use tkinter's scheduler to shift focus after a short delay
+        Window.window.after(10, lambda: (page_combo.selection_clear(), Window.window.focus_force()))
+        name = page_var.get().strip()
+
+        # Typing a new name starts a new page
+        if not is_valid(name):
+            page_var.set(Settings.get("page"))
+            return "break"
+
+        switch(name)
+        # Keep Return from speaking a phrase too
+        return "break"
+
+    page_combo.bind("<<ComboboxSelected>>", on_select)
+    page_combo.bind("<Return>", on_select)
@@ -0,0 +1,120 @@
+import mmap
+import os
+import struct
+from array import array
+
+# A phrase file is read through a memory map with an index of where each
+# line starts, and a line is only decoded when it is asked for. The
+# index is saved next to the file and reused while the file's size and
+# mtime match, so opening a large file doesn't read it all.
+
+HEADER = struct.Struct("<QQc")  # File size, mtime in nanoseconds, index typecode
+
+def get_index_path(filepath):
+    return filepath.with_suffix(".index")
+
+def build_index(data):
+    """Offsets where each line starts, plus one past the end"""
+    # Four bytes per line is enough below 4GB
+    offsets = array("I" if len(data) < 2 ** 32 else "Q", [0])
+    find = data.find
+    pos = find(b"\n")
+
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = find(b"\n", pos + 1)
+
+    # The end of the last line, which has no newline
+    offsets.append(len(data) + 1)
+    return offsets
+
+def load_index(filepath, stat):
+    """The saved index of a file, None if it is missing or out of date"""
+    try:
+        with open(get_index_path(filepath), "rb") as file:
+            size, mtime, typecode = HEADER.unpack(file.read(HEADER.size))
+
+            if size != stat.st_size or mtime != stat.st_mtime_ns:
+                return None
+
+            offsets = array(typecode.decode())
+            offsets.frombytes(file.read())
+            return offsets
+    except (OSError, ValueError, struct.error):
+        return None
+
+def save_index(filepath, stat, offsets):
+    indexpath = get_index_path(filepath)
+    tmppath = indexpath.with_name(f".{indexpath.name}.tmp")
+
+    try:
+        with open(tmppath, "wb") as file:
+            file.write(HEADER.pack(stat.st_size, stat.st_mtime_ns, offsets.typecode.encode()))
+            offsets.tofile(file)
+
+        os.replace(tmppath, indexpath)
+    except OSError as e:
+        print(f"Error saving phrase index: {e}")
+
+class Phrases:
+    """The phrases of a file as a list, lines past its end read as default.
+
+    Assigned and appended phrases are kept in memory on top of the file.
+    """
+
+    def __init__(self, filepath, count=0, default=""):
+        self.default = default
+        self.changed = {}  # Phrases set since the file was read, by index
+
+        with open(filepath, "rb") as file:
+            stat = os.fstat(file.fileno())
+            # Empty files can't be mapped
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+
+        self.offsets = load_index(filepath, stat)
+
+        if self.offsets is None:
+            self.offsets = build_index(self.data)
+            save_index(filepath, stat, self.offsets)
+
+        self.lines = len(self.offsets) - 1
+        self.length = max(self.lines, count)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[n] for n in range(*i.indices(self.length))]
+
+        if i < 0:
+            i += self.length
+
+        if i in self.changed:
+            return self.changed[i]
+
+        if not 0 <= i < self.length:
+            raise IndexError("phrase index out of range")
+
+        if i >= self.lines:
+            return self.default
+
+        # Decoding strips the newline and a \r before it
+        return self.data[self.offsets[i]:self.offsets[i + 1] - 1].decode(errors="replace").strip()
+
+    def __setitem__(self, i, text):
+        if i < 0:
+            i += self.length
+
+        if not 0 <= i < self.length:
+            raise IndexError("phrase index out of range")
+
+        self.changed[i] = text
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def append(self, text):
+        self.changed[self.length] = text
+        self.length += 1
@@ -0,0 +1,103 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cache as Cache
+import settings as Settings
+import engine as Engine
+import model as Model
+import window as Window
+
+# Once things go quiet every phrase is rendered into the cache for the
+# current voice, so any Speak is a cache hit. The cache is content
+# addressed, so only phrases whose text changed, or all of them after a
+# voice change, get rendered again. Speed and volume are applied when a
+# clip plays, changing them renders nothing.
+
+DELAY = 2000  # Milliseconds without changes before a pass starts
+
+pending = None  # Scheduled pass, if any
+generation = 0  # Bumped per pass so an outdated pass gives up
+
+def setup():
+    """Start a pass when phrases or what they sound like change"""
+    Settings.subscribe(on_setting)
+    Model.subscribe(on_change)
+    schedule()
+
+def on_setting(key, value):
+    if key in ["voice", "synth", "page"]:
+        schedule()
+
+def on_change(event, *args):
+    if event == "edit":
+        schedule()
+
+def schedule():
+    """Start a pass once nothing has changed for a while"""
+    global pending
+
+    if Settings.get("prerender_jobs") <= 0 or Settings.get("cache_size") <= 0:
+        return
+
+    if pending is not None:
+        Window.window.after_cancel(pending)
+
+    pending = Window.window.after(DELAY, start)
+
+def get_texts():
+    """The distinct texts Speak would render, long ones as their chunks"""
+    texts = []
+    limit = Settings.get("chunk_length")
+
+    for text in Settings.speech[:Settings.get("num_items")]:
+        text = text.strip()
+
+        if len(text) > limit:
+            texts.extend(Engine.split_text(text, limit))
+        elif text:
+            texts.append(text)
+
+    return list(dict.fromkeys(texts))
+
+def start():
+    """Snapshot the settings on the main thread and render in the background"""
+    global pending, generation
+
+    pending = None
+    generation += 1
+    params = (Settings.get("synth"), Settings.voice_var.get())
+    threading.Thread(target=run, args=(params, generation), daemon=True).start()
+
+def run(params, my_generation):
+    synth, voice = params
+    # Reading every phrase can take a while for a large file
+    texts = get_texts()
+    missing = [text for text in texts if not Cache.has(synth, voice, text)]
+
+    if not missing:
+        return
+
+    # Stop short of the cache cap, past it the pass would evict its own clips
+    budget = Settings.get("cache_size") * 1024 * 1024 - Cache.get_size()
+    failed = False
+
+    def render(text):
+        nonlocal budget, failed
+
+        if failed or budget <= 0 or my_generation != generation:
+            return
+
+        try:
+            filepath = Cache.render(synth, voice, text, background=True)
+
+            if filepath:
+                budget -= filepath.stat().st_size
+        except Exception as e:
+            # No point trying the rest with a synth that fails
+            failed = True
+            print(f"Error prerendering: {e}")
+
+    # Each job drives a synth process, so they spread over the cores
+    with ThreadPoolExecutor(max_workers=Settings.get("prerender_jobs")) as pool:
+        for text in missing:
+            pool.submit(render, text)
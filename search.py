@@ -0,0 +1,266 @@
+import heapq
+import threading
+
+MIN_SHARE = 0.5  # Share of the query's bigrams a phrase needs to be ranked
+CANDIDATES = 2000  # Most phrases scored per fuzzy query, so big phrasebooks cost the same
+
+texts = []  # Lowercased phrase text by index
+grams = {}  # Trigram to the set of phrase indices containing it
+pairs = {}  # Bigram to the set of phrase indices containing it
+pair_counts = []  # Number of distinct bigrams in each phrase
+last_query = None
+last_results = None
+source = None  # Phrases and count being indexed, see build
+dirty = set()  # Phrases edited while they were being indexed
+building = None  # The source a thread is indexing
+search_lock = threading.Lock()
+
+def get_grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def get_pairs(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def add(table, keys, n):
+    for key in keys:
+        table.setdefault(key, set()).add(n)
+
+def remove(table, keys, n):
+    for key in keys:
+        indices = table[key]
+        indices.discard(n)
+
+        if not indices:
+            del table[key]
+
+def build(phrases, count):
+    """Index the first count phrases from scratch on a background thread.
+
+    Until the index is ready queries scan the phrases instead, so a large
+    file doesn't hold up loading or the first keystroke.
+    """
+    global texts, grams, pairs, pair_counts, last_query, source, dirty
+
+    with search_lock:
+        texts = []
+        grams = {}
+        pairs = {}
+        pair_counts = []
+        last_query = None
+        source = (phrases, count)
+        # A put away page may hold on to the old one
+        dirty = set()
+
+    start()
+
+def start():
+    """Index source unless that is already under way"""
+    global building
+
+    if source is None or building is source:
+        return
+
+    building = source
+    threading.Thread(target=run, args=(source,), daemon=True).start()
+
+def run(my_source):
+    global texts, grams, pairs, pair_counts, last_query, source, building
+
+    phrases, count = my_source
+    new_texts = [phrases[n].lower() for n in range(count)]
+
+    with search_lock:
+        # Scanning these is quicker than reading the phrases
+        if source is my_source:
+            texts = new_texts
+
+    new_grams = {}
+    new_pairs = {}
+    new_pair_counts = [0] * count
+
+    for n, text in enumerate(new_texts):
+        add(new_grams, get_grams(text), n)
+        text_pairs = get_pairs(text)
+        add(new_pairs, text_pairs, n)
+        new_pair_counts[n] = len(text_pairs)
+
+    with search_lock:
+        if building is my_source:
+            building = None
+
+        # Another page or a rebuild took over, an index for it is of no use
+        if source is not my_source:
+            return
+
+        texts = new_texts
+        grams = new_grams
+        pairs = new_pairs
+        pair_counts = new_pair_counts
+        last_query = None
+        source = None
+
+        # Edits that came in after their phrase was read
+        for n in dirty:
+            reindex(n, phrases[n])
+
+        dirty.clear()
+
+def scan(text):
+    """Indices of phrases containing text, checked one by one while there is no index"""
+    global last_query, last_results
+
+    start()
+    phrases, count = source
+
+    if len(texts) < count:
+        return [n for n in range(count) if text in phrases[n].lower()]
+
+    if last_query is not None and last_query in text:
+        candidates = last_results
+    else:
+        candidates = range(count)
+
+    results = [n for n in candidates if text in texts[n]]
+
+    if dirty:
+        # Edited since texts were read
+        results = {n for n in results if n not in dirty}
+        results.update(n for n in dirty if n < count and text in phrases[n].lower())
+        results = sorted(results)
+
+    last_query = text
+    last_results = results
+    return results
+
+def update(n, text):
+    """Reindex phrase n after it was edited or moved"""
+    global last_query
+
+    with search_lock:
+        # Being indexed, the build catches up with it once it is done
+        if source is not None:
+            dirty.add(n)
+            return
+
+        reindex(n, text)
+        # Previous results may no longer hold
+        last_query = None
+
+def reindex(n, text):
+    # Phrases past num_items aren't shown so they aren't indexed
+    if n >= len(texts):
+        return
+
+    old = texts[n]
+    new = text.lower()
+
+    if old == new:
+        return
+
+    old_grams = get_grams(old)
+    new_grams = get_grams(new)
+    remove(grams, old_grams - new_grams, n)
+    add(grams, new_grams - old_grams, n)
+
+    old_pairs = get_pairs(old)
+    new_pairs = get_pairs(new)
+    remove(pairs, old_pairs - new_pairs, n)
+    add(pairs, new_pairs - old_pairs, n)
+    pair_counts[n] = len(new_pairs)
+
+    texts[n] = new
+
+def query(text):
+    """Return the sorted indices of phrases containing text, ignoring case"""
+    text = text.lower()
+
+    with search_lock:
+        if source is not None:
+            return scan(text)
+
+        return lookup(text)
+
+def lookup(text):
+    global last_query, last_results
+
+    if last_query is not None and last_query in text:
+        # Anything matching the longer query matched the previous one too
+        candidates = last_results
+    elif len(text) >= 3:
+        # Intersect posting sets, smallest first so the working set stays small
+        postings = sorted((grams.get(gram, set()) for gram in get_grams(text)), key=len)
+        candidates = set(postings[0])
+
+        for indices in postings[1:]:
+            candidates &= indices
+
+            if not candidates:
+                break
+
+        candidates = sorted(candidates)
+    else:
+        candidates = range(len(texts))
+
+    # Trigrams can match out of order, confirm the substring
+    results = [n for n in candidates if text in texts[n]]
+
+    last_query = text
+    last_results = results
+    return results
+
+def fuzzy(text, k):
+    """Return up to k phrase indices ranked by how well they match text.
+
+    Scores are the bigram overlap (Dice coefficient) so typos still
+    match, and phrases containing text exactly rank above the rest.
+    Only phrases sharing at least MIN_SHARE of the query's bigrams are
+    ranked, and at most CANDIDATES of them are scored.
+    """
+    text = text.lower()
+
+    with search_lock:
+        # Until the index is ready, and for text too short to have
+        # bigrams, fall back to plain matching
+        if source is not None:
+            return scan(text)[:k]
+
+        if len(text) < 2:
+            return lookup(text)[:k]
+
+        return rank(text, k)
+
+def rank(text, k):
+    text_pairs = get_pairs(text)
+
+    postings = sorted((pairs.get(pair, set()) for pair in text_pairs), key=len)
+    needed = max(int(len(postings) * MIN_SHARE + 0.5), 1)
+
+    # A phrase with needed of the bigrams has one of the rarest
+    # len - needed + 1, so the common ones are never walked
+    candidates = set()
+
+    for indices in postings[:len(postings) - needed + 1]:
+        room = CANDIDATES - len(candidates)
+
+        if len(indices) > room:
+            # Rarer postings are taken whole, earlier phrases fill what is left
+            candidates.update(heapq.nsmallest(room, indices - candidates))
+            break
+
+        candidates.update(indices)
+
+    shared = {}
+
+    for n in candidates:
+        count = sum(1 for indices in postings if n in indices)
+
+        if count >= needed:
+            shared[n] = count
+
+    def score(n):
+        dice = 2 * shared[n] / (len(text_pairs) + pair_counts[n])
+        exact = 1 if text in texts[n] else 0
+        # Earlier phrases win ties
+        return (exact, dice, -n)
+
+    return heapq.nlargest(k, shared, key=score)
@@ -1,50 +1,123 @@
 import widgets as Widgets
+import os
 import tkinter as tk
 from pathlib import Path
 from tkinter import messagebox
-from subprocess import Popen, PIPE
 
 import inputs as Inputs
 import widgets as Widgets
 import filterwid as Filter
+import speech as Speech
+import search as Search
+import store as Store
+import autosave as Autosave
+import voices as Voices
+import prerender as Prerender
 import window as Window
+import pages as Pages
 import settings as Settings
 
-DEFAULTS = {
-    "default_text": lambda: "",
-    "voice": lambda: voices[0] if voices else "",
-    "speed": lambda: "1.0",
-    "volume": lambda: "1.0",
-    "synth": lambda: "espeak",
-    "width": lambda: 660,
-    "height": lambda: 700,
-    "background": lambda: "#2d2d2d",
-    "title": lambda: "Strudel",
-    "num_items": lambda: 50,
+# Every setting has a type, a default and optionally a check. Defaults
+# that depend on the environment are functions. Values are parsed and
+# checked once, when settings.txt is loaded or a value is set, so get
+# is a dict lookup.
+SCHEMA = {
+    "default_text": (str, ""),
+    "voice": (str, lambda: voices[0] if voices else ""),
+    "speed": (float, 1.0, lambda value: value > 0),
+    "volume": (float, 1.0, lambda value: 0 <= value <= 1),
+    "synth": (str, "espeak"),
+    "width": (int, 660, lambda value: value > 0),
+    "height": (int, 700, lambda value: value > 0),
+    "background": (str, "#2d2d2d"),
+    "title": (str, "Strudel"),
+    "num_items": (int, 50, lambda value: value > 0),
+    "player": (str, "aplay -q"),
+    "cache_size": (int, 100, lambda value: value >= 0),
+    "worker": (bool, True),
+    "filter_mode": (str, "exact", lambda value: value in ["exact", "fuzzy"]),
+    "fuzzy_results": (int, 10, lambda value: value > 0),
+    "autosave_delay": (float, 0.2, lambda value: value >= 0),
+    "speech_mode": (str, "interrupt", lambda value: value in ["interrupt", "queue", "mix"]),
+    "chunk_length": (int, 200, lambda value: value > 0),
+    "chunk_workers": (int, 2, lambda value: value > 0),
+    "prerender_jobs": (int, lambda: max(1, (os.cpu_count() or 2) // 2), lambda value: value >= 0),
+    "mix_voices": (int, 4, lambda value: value > 0),
+    "sink": (bool, False),
+    "sink_player": (str, "aplay -q -t raw -f S16_LE -c 1 -r 22050"),
+    "metrics_file": (str, ""),
+    "metrics_interval": (float, 10.0, lambda value: value > 0),
+    "metrics_overlay": (bool, False),
+    "page": (str, "speech", lambda value: Pages.is_valid(value)),
+    "page_cache": (int, 3, lambda value: value >= 0),
+    "prefetch_count": (int, 5, lambda value: value >= 0),
+    "prefetch_budget": (int, 20, lambda value: value >= 0),
 }
 
-settings = {}
+settings = {}  # Setting values as they are written in settings.txt
+values = {}  # Parsed values of the settings that are set
+listeners = []
 voice_var = None
 speed_var = None
 volume_var = None
 speech = []
 voices = []
+voice_combo = None
 volume_combo = None
+discovering = False  # Whether the synth still has to be asked for voices
 
 def get(key):
-    value = settings.get(key, DEFAULTS[key]())
+    try:
+        return values[key]
+    except KeyError:
+        default = SCHEMA[key][1]
+        return default() if callable(default) else default
 
-    if key in ["num_items"]:
-        try:
-            return int(value)
-        except ValueError:
-            return DEFAULTS[key]()
+def parse(key, value):
+    """Convert a value to the setting's type, raises ValueError if it doesn't fit"""
+    kind, _, check = (SCHEMA[key] + (None,))[:3]
+
+    if kind is bool and isinstance(value, str):
+        if value.lower() not in ["true", "yes", "1", "false", "no", "0"]:
+            raise ValueError(f"{value} is not true or false")
+
+        value = value.lower() in ["true", "yes", "1"]
+
+    value = kind(value)
+
+    if check and not check(value):
+        raise ValueError(f"{value} is out of range")
 
     return value
 
+def to_text(value):
+    """A value as it is written in settings.txt"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    return str(value)
+
 def set(key, value):
-    """Set a setting value and update the global settings dictionary"""
-    settings[key] = value
+    """Set a setting, tell the listeners and have the writer save it.
+
+    Raises ValueError if the value doesn't fit the setting.
+    """
+    value = parse(key, value)
+
+    if key in values and values[key] == value:
+        return
+
+    values[key] = value
+    settings[key] = to_text(value)
+    # Writes are batched, a burst of changes is saved at once
+    Autosave.mark("settings")
+
+    for callback in listeners:
+        callback(key, value)
+
+def subscribe(callback):
+    """Call callback(key, value) when a setting changes"""
+    listeners.append(callback)
 
 def get_settings_path():
     thispath = Path(__file__).parent.resolve()
@@ -61,8 +134,12 @@ def get_voices_path():
     filepath = Path(thispath) / "voices.txt"
     return filepath
 
-def setup():
-    global settings
+def setup(follow=False):
+    """Load the settings and the phrases of the active page.
+
+    With follow the phrase files are only read, another process owns them.
+    """
+    global settings, values, speech
 
     try:
         filepath = get_settings_path()
@@ -74,20 +151,40 @@ def setup():
             setts = list(filter(None, setts))
 
         settings = {}  # Reset settings before loading
+        values = {}
 
         for s in setts:
             if "=" in s:
                 sp = s.split("=", 1)  # Split on first = only
-                set(sp[0], sp[1])  # Update global settings
+                settings[sp[0]] = sp[1]  # Update global settings
             else:
                 print(f"Ignored malformed setting: {s}")
     except Exception as e:
         print(f"Error loading settings: {e}")
         settings = {}  # Reset to empty if there was an error
 
-    get_speech()
+    load(settings)
+
+    try:
+        get_speech(follow=follow)
+    except FileNotFoundError:
+        # Nothing saved yet
+        speech = [get("default_text")] * get("num_items")
+
     get_voices()
 
+def load(raw):
+    """Parse settings read from settings.txt, bad values fall back to the default"""
+    for key, value in raw.items():
+        # Settings this version doesn't know are kept as they are
+        if key not in SCHEMA:
+            continue
+
+        try:
+            values[key] = parse(key, value)
+        except ValueError as e:
+            print(f"Ignored setting {key}: {e}")
+
 def setup_speed(container):
     global speed_var, speed_map
 
@@ -99,7 +196,7 @@ def setup_speed(container):
     speed_label.pack(side="top", pady=(0, 2))
 
     # Available speech speeds with descriptive labels
-    speed_values = ["2.0", "1.75", "1.5", "1.25", "1.0", "0.75", "0.5", "0.25"]
+    speed_values = [2.0, 1.75, 1.5, 1.25, 1.0, 0.75, 0.5, 0.25]
     speed_labels = ["2.0×", "1.75×", "1.5×", "1.25×", "1.0×", "0.75×", "0.5×", "0.25×"]
 
     # Create a dictionary to map display labels to actual values
@@ -122,14 +219,14 @@ def setup_speed(container):
         Window.window.after(10, lambda: (speed_combo.selection_clear(), Window.window.focus_force()))
         # Get the selected display label and convert to actual value
         selected_label = speed_var.get()
-        actual_value = speed_map.get(selected_label, "1.0")  # Default to 1.0 if not found
-        # Update settings when speed changes
+        actual_value = speed_map.get(selected_label, 1.0)  # Default to 1.0 if not found
+        # Update settings when speed changes, listeners warm the worker
         set("speed", actual_value)
 
     speed_combo.bind("<<ComboboxSelected>>", handle_speed_select)
 
 def setup_voice(container):
-    global voice_var
+    global voice_var, voice_combo
 
     # Voice selection with label
     voice_frame = Widgets.create_frame(container)
@@ -147,9 +244,15 @@ def setup_voice(container):
     def handle_combobox_select(event):
         # Use tkinter's scheduler to shift focus after a short delay
         Window.window.after(1, lambda: (voice_combo.selection_clear(), Window.window.focus_force()))
+        Speech.warm()
+        Prerender.schedule()
 
     voice_combo.bind("<<ComboboxSelected>>", handle_combobox_select)
 
+    if discovering:
+        # Use after() to hand the result to the main thread
+        Voices.discover(get("synth"), lambda found: Window.window.after(0, lambda: update_voices(found)))
+
 def setup_volume(container):
     global volume_combo, volume_var, volume_map
 
@@ -161,7 +264,7 @@ def setup_volume(container):
     volume_label.pack(side="top", pady=(0, 2))
 
     # Available volume levels (1.0 to 0.1) with percentage display
-    volume_values = ["1.0", "0.9", "0.8", "0.7", "0.6", "0.5", "0.4", "0.3", "0.2", "0.1"]
+    volume_values = [1.0, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1]
     volume_labels = ["100%", "90%", "80%", "70%", "60%", "50%", "40%", "30%", "20%", "10%"]
 
     # Create a dictionary to map display labels to actual values
@@ -184,37 +287,42 @@ def setup_volume(container):
         Window.window.after(10, lambda: (Settings.volume_combo.selection_clear(), Window.window.focus_force()))
         # Get the selected display label and convert to actual value
         selected_label = volume_var.get()
-        actual_value = volume_map.get(selected_label, "1.0")  # Default to 1.0 if not found
-        # Update settings when volume changes
-        settings["volume"] = actual_value
+        actual_value = volume_map.get(selected_label, 1.0)  # Default to 1.0 if not found
+        # Update settings when volume changes, listeners warm the worker
+        set("volume", actual_value)
 
     volume_combo.bind("<<ComboboxSelected>>", handle_volume_select)
 
-def get_speech():
+def get_speech(filepath=None, follow=False):
+    """Load the phrases of a page, the active one by default.
+
+    With follow the file and its journal are only read, nothing is saved.
+    Raises FileNotFoundError if the file is missing then.
+    """
     global speech
 
     num_items = get("num_items")
 
-    try:
-        filepath = get_speech_path()
-        filepath.touch(exist_ok=True)
+    if filepath is None:
+        filepath = Pages.get_path(get("page"))
 
-        with open(filepath, "r") as file:
-            speech = file.read().split("\n")
-            # Keep empty strings by removing the filter
-            speech = list(map(str.strip, speech))
-
-        # Fill with default text if needed
-        for n in range(0, num_items):
-            if n >= len(speech):
-                speech.append(get("default_text"))
+    if follow:
+        speech = Store.read(filepath, num_items, get("default_text"))
+        return
+
+    try:
+        # The store owns the list, changes go through it so they get journaled
+        speech = Store.load(filepath, num_items, get("default_text"))
     except Exception as e:
         print(f"Error loading speech: {e}")
         # Create default entries if loading fails
-        speech = [get("default_text")] * num_items
+        Store.phrases = [get("default_text")] * num_items
+        speech = Store.phrases
+
+    Search.build(speech, num_items)
 
 def get_voices():
-    global voices
+    global voices, discovering
 
     try:
         filepath = get_voices_path()
@@ -225,59 +333,55 @@ def get_voices():
             voices = list(map(str.strip, voices))
             voices = list(filter(None, voices))
 
-        # If no voices in file, try getting from synth
+        # If no voices in file, use what the synth reported last time
         if not voices:
-            try:
-                process = Popen([get("synth"), "--voices=en"], stdout=PIPE)
-                output, _ = process.communicate()
-
-                if output:
-                    lines = output.decode().split("\n")
-
-                    # Parse voices from synth output (skip header line)
-                    for line in lines[1:]:
-                        parts = line.split()
+            cached = Voices.load(get("synth"))
 
-                        if len(parts) > 1:
-                            voices.append(parts[3])
-            except Exception as e:
-                print(f"Error getting synth voices: {e}")
+            if cached is not None:
+                voices = [voice["name"] for voice in cached]
+            else:
+                # Start with the last known voice and ask the synth
+                # once the window is up, see setup_voice
+                voices = [settings["voice"]] if settings.get("voice") else []
+                discovering = True
     except Exception as e:
         print(f"Error loading voices: {e}")
         voices = ["default"]  # Provide at least a default option
 
-def save_speech():
-    try:
-        # Update the speech list with the current text in all input entries
-        for i, entry in enumerate(Inputs.entries):
-            if i < len(speech):
-                speech[i] = entry.get()
-            else:
-                speech.append(entry.get())
+def update_voices(found):
+    """Show the voices found by discovery, runs on the main thread"""
+    global voices
+
+    if not found:
+        return
 
-        filepath = get_speech_path()
+    voices = found
+    voice_combo.configure(values=voices)
 
-        with open(filepath, "w") as file:
-            # Don't strip the joined string to preserve empty lines
-            file.write("\n".join(speech))
-    except Exception as e:
-        print(f"Error saving speech: {e}")
-        messagebox.showerror("Error", f"Failed to save speech: {e}")
+    if not voice_var.get():
+        voice_var.set(voices[0])
+        Speech.warm()
+        Prerender.schedule()
+
+def save_speech():
+    """Have the autosave writer fold the journal into speech.txt"""
+    Autosave.mark("compact")
 
 def save():
-    try:
-        filepath = get_settings_path()
+    """Have the autosave writer save the settings"""
+    Autosave.mark("settings")
 
-        with open(filepath, "w") as file:
-            settings_text = ""
+def write():
+    """Write the settings file, called from the autosave writer"""
+    try:
+        settings_text = ""
 
-            for key in settings:
-                settings_text += f"{key}={settings[key]}\n"
+        for key, value in dict(settings).items():
+            settings_text += f"{key}={value}\n"
 
-            file.write(settings_text.strip())
+        Store.write_atomic(get_settings_path(), settings_text.strip())
     except Exception as e:
         print(f"Error saving settings: {e}")
-        messagebox.showerror("Error", f"Failed to save settings: {e}")
 
 def reset():
     global speech, voices, settings
@@ -289,12 +393,14 @@ def reset():
     if not confirm:
         return
 
-    # Reset all entry fields
-    for i, entry in enumerate(Inputs.entries):
-        entry.delete(0, tk.END)
-        entry.insert(0, get("default_text"))
+    # Reset all inputs
+    for i in range(get("num_items")):
         speech[i] = get("default_text")
 
+    Search.build(speech, get("num_items"))
+    Speech.sync()
+    Inputs.render()
+
     # Reset voice to first available voice
     if voices:
         voice_var.set(voices[0])
@@ -303,12 +409,12 @@ def reset():
     # Reset speed to default if it exists
     if "speed" in settings:
         speed_var.set("1.0×")  # Set to the label for default speed
-        set("speed", "1.0")
+        set("speed", 1.0)
 
     # Reset volume to default
     if "volume" in settings:
         volume_var.set("100%")  # Set to the label for default volume
-        set("volume", "1.0")
+        set("volume", 1.0)
 
     # Clear any active filter
     Filter.clear()
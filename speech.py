@@ -1,117 +1,134 @@
-import threading
+import time
 from tkinter import messagebox
-import os
-import signal
-from subprocess import Popen, PIPE
 
+import client as Client
+import daemon as Daemon
+import engine as Engine
+import metrics as Metrics
+import mixer as Mixer
+import model as Model
 import inputs as Inputs
+import usage as Usage
 import settings as Settings
 import window as Window
 
-speech_lock = threading.Lock()
-current_speech_process = None
+# The window is a client of the speech daemon, see daemon.py
 
-def callback(n, entry=None):
-    if not entry:
-      entry = Inputs.entries[n]
+standalone = False  # Whether the daemon runs on its own and needs phrase changes sent
 
-    s = entry.get().strip()
+def setup():
+    """Use the running daemon, or start one in this process"""
+    Daemon.start_thread()
+    Client.connect()
+    Settings.subscribe(on_setting)
+    Model.subscribe(on_change)
+    # A daemon of its own may have loaded another page, or older phrases
+    send_page(Settings.get("page"))
+
+def on_setting(key, value):
+    # The worker is started with these
+    if key in ["speed", "volume", "synth", "worker"]:
+        warm()
+
+    if key == "page":
+        send_page(value)
+
+def send_page(name):
+    """Have a daemon of its own load a page, its reply says what kind it is"""
+    def on_reply(reply):
+        global standalone
+        standalone = reply.get("standalone", False)
+
+    Client.request({"cmd": "page", "name": name}, on_reply)
+
+def on_change(event, *args):
+    # A daemon inside a window reads that window's phrases
+    if not standalone or event not in ["edit", "swap"]:
+        return
+
+    Client.request({"cmd": "phrases", "changes": {n: Settings.speech[n] for n in args}})
+
+def sync():
+    """Send every phrase to a daemon of its own, after they all changed at once"""
+    if not standalone:
+        return
+
+    Client.request({"cmd": "phrases", "changes": dict(enumerate(Settings.speech[:Settings.get("num_items")]))})
+
+def callback(n, entry=None, now=False):
+    if n is None and not entry:
+      return
+
+    if entry:
+      s = entry.get().strip()
+      row = Model.get_row(entry)
+
+      # A phrase in the list rather than the filter box
+      if row is not None:
+        n = Inputs.bound[row]
+    else:
+      s = Settings.speech[n].strip()
 
     if not s:
       return
 
+    if n is not None:
+      Usage.record(n)
+
+    start = time.monotonic()
     v = Settings.voice_var.get()
     # Update speed setting to current selection - convert from label to value
     selected_speed_label = Settings.speed_var.get()
-    Settings.set("speed", Settings.speed_map.get(selected_speed_label, "1.0"))
+    Settings.set("speed", Settings.speed_map.get(selected_speed_label, 1.0))
 
     # Update volume setting to current selection - convert from label to value
     selected_volume_label = Settings.volume_var.get()
-    Settings.set("volume", Settings.volume_map.get(selected_volume_label, "1.0"))
-
-    speak(n, s, v)
+    Settings.set("volume", Settings.volume_map.get(selected_volume_label, 1.0))
+
+    message = {
+        "cmd": "speak",
+        "text": s,
+        "voice": v,
+        "speed": Settings.get("speed"),
+        "volume": Settings.get("volume"),
+        "queue": Settings.get("speech_mode") == "queue",
+        "mix": Settings.get("speech_mode") == "mix",
+        "now": now,
+    }
+
+    def on_reply(reply):
+        Metrics.record("speak_reply", start)
+
+        # Use after() to get back on the main thread
+        if reply["ok"]:
+            Window.window.after(0, lambda: remember_voice(v))
+        else:
+            Window.window.after(0, lambda: messagebox.showerror("Speech Error", reply["error"]))
+
+    Client.request(message, on_reply)
+    Metrics.record("speak_callback", start)
 
 def stop():
-    """Stop any currently running speech"""
-    global current_speech_process
-
-    with speech_lock:
-        if current_speech_process and current_speech_process.poll() is None:
-            try:
-                current_speech_process.terminate()
-                # Wait briefly for process to terminate
-                current_speech_process.wait(timeout=1)
-            except Exception as e:
-                print("Error stopping speech")
-                # Force kill if terminate fails
-                try:
-                    os.kill(current_speech_process.pid, signal.SIGKILL)
-                except:
-                    pass
-
-def run_thread(n, s, v):
-    """Function to run in a separate thread for speaking"""
-    global current_speech_process, speech
-
-    try:
-        # Get current speed setting
-        speed = Settings.get("speed")
-        # Get current volume setting
-        volume = Settings.get("volume")
-
-        # Convert speed to words per minute for synth (-s option)
-        # Default synth speed is 175 words per minute
-        base_wpm = 175
-
-        try:
-            speed_float = float(speed)
-            wpm = int(base_wpm * speed_float)
-        except (ValueError, TypeError):
-            # Default to normal speed if conversion fails
-            wpm = base_wpm
-
-        # Convert volume to amplitude percentage for synth (-a option)
-        # Default is 100, our UI shows 0.1 to 1.0
-        try:
-            volume_float = float(volume)
-            amplitude = int(volume_float * 100)  # Convert to percentage (0-100)
-        except (ValueError, TypeError):
-            # Default to full volume if conversion fails
-            amplitude = 100
-
-        with speech_lock:
-            current_speech_process = Popen([Settings.get("synth"), "-v", v, "-s", str(wpm), "-a", str(amplitude), s], stderr=PIPE)
-
-        # Wait for the process outside the lock to allow other threads to interrupt
-        _, error = current_speech_process.communicate()
-
-        with speech_lock:
-            if current_speech_process.returncode != 0 and error:
-                error_msg = error.decode().strip()
-                print(f"Synth error: {error_msg}")
-                # Use after() to schedule the messagebox from the main thread
-                Window.window.after(0, lambda: messagebox.showerror("Speech Error", f"Failed to speak: {error_msg}"))
-                return
-
-            # Voice settings will still be saved
-            # (We're not updating speech here anymore as it's done in save_speech)
-
-            # Update voice setting if it changed
-            if Settings.get("voice") != v:
-                Settings.set("voice", v)
-                # Use after() to schedule the save from the main thread
-                Window.window.after(0, Settings.save)
-
-    except Exception as e:
-        print(e)
-        # Use after() to schedule the messagebox from the main thread
-        Window.window.after(0, lambda: messagebox.showerror("Error", "Failed to run synth"))
-
-def speak(n, s, v):
-    """Start speech in a separate thread, stopping any current speech first"""
-    stop()
-
-    # Start a new thread for speaking
-    speech_thread = threading.Thread(target=run_thread, args=(n, s, v))
-    speech_thread.daemon = True  # Make thread exit when main program exits
-    speech_thread.start()
\ No newline at end of file
+    """Stop any currently running speech and drop what is queued"""
+    Client.request({"cmd": "stop"})
+
+def warm():
+    """Start or restart the worker for the current voice, speed and volume"""
+    Client.request({
+        "cmd": "warm",
+        "voice": Settings.voice_var.get(),
+        "speed": Settings.get("speed"),
+        "volume": Settings.get("volume"),
+    })
+
+def shutdown():
+    """Stop speech started from this process right away, used when exiting"""
+    Engine.stop()
+    Mixer.shutdown()
+    Daemon.shutdown()
+
+def remember_voice(v):
+    """Update the voice setting if it changed"""
+    if Settings.get("voice") != v:
+        Settings.set("voice", v)
+        Settings.save()
@@ -0,0 +1,105 @@
+import heapq
+import itertools
+import threading
+
+import cache as Cache
+import engine as Engine
+
+# Queued utterances play one after another. While one plays the next
+# is rendered into the cache, so there is no synthesis gap between them.
+
+NOW = 0  # Barge-in, plays before anything else
+HIGH = 1
+NORMAL = 2
+PRIORITIES = {"high": HIGH, "normal": NORMAL}  # What requests may ask for, barge-in has its own flag
+
+cond = threading.Condition()
+heap = []  # (priority, order, item), items are (text, synth, voice, wpm, amplitude)
+order = itertools.count()  # Keeps equal priorities first in, first out
+player = None
+playing = False
+
+def add(item, priority=NORMAL):
+    """Queue an utterance"""
+    with cond:
+        push(item, priority)
+        head = heap[0][2]
+
+    # Something is playing, get the next one ready now
+    if playing and head is item:
+        prerender(item)
+
+def push(item, priority):
+    global player
+
+    heapq.heappush(heap, (priority, next(order), item))
+    cond.notify()
+
+    if not player:
+        player = threading.Thread(target=run, daemon=True)
+        player.start()
+
+def barge_in(item):
+    """Cut off the current utterance and play item right away"""
+    # Hold the queue so the player picks item next, with the new speech id
+    with cond:
+        Engine.interrupt()
+        push(item, NOW)
+
+def clear():
+    with cond:
+        heap.clear()
+
+def get_clip(item, on_spawn=None):
+    """Return the cached clip for item, rendering it on a miss"""
+    text, synth, voice, _, _ = item
+    filepath = Cache.lookup(synth, voice, text)
+
+    if not filepath:
+        filepath = Cache.render(synth, voice, text, on_spawn=on_spawn)
+
+    return filepath
+
+def prerender(item):
+    def run():
+        try:
+            get_clip(item)
+        except Exception as e:
+            print(f"Error rendering queued speech: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+def run():
+    global playing
+
+    while True:
+        with cond:
+            while not heap:
+                playing = False
+                cond.wait()
+
+            playing = True
+            _, _, item = heapq.heappop(heap)
+            upcoming = heap[0][2] if heap else None
+            # Taken with the item so a stop that clears the queue also stops it
+            my_id = Engine.speech_id
+
+        try:
+            play(item, upcoming, my_id)
+        except Exception as e:
+            print(f"Error playing queued speech: {e}")
+
+def play(item, upcoming, my_id):
+    filepath = get_clip(item, on_spawn=lambda process: Engine.track(process, my_id))
+
+    # Interrupted while rendering
+    if not filepath or my_id != Engine.speech_id:
+        return
+
+    if upcoming:
+        prerender(upcoming)
+
+    _, _, _, wpm, amplitude = item
+    process = Engine.play(filepath, wpm, amplitude)
+    Engine.track(process, my_id)
+    process.communicate()
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+
+import autosave as Autosave
+import phrasefile as PhraseFile
+
+# Phrases live in a plain text snapshot with one phrase per line, plus
+# a journal of changes made since. Each journal line maps indices to
+# their new text, so replaying it twice gives the same result and a
+# crash between a compaction and the journal reset does no harm.
+
+COMPACT_AFTER = 500  # Journal lines before the snapshot is rewritten
+
+store_lock = threading.Lock()
+phrases = []
+pending = {}  # Changes waiting for the autosave writer
+away = []  # (snapshot path, changes) of pages put away before the writer got to them
+snapshot_path = None
+journals = {}  # Append handles by snapshot path, only the autosave writer uses them
+journal_lines = 0
+
+def get_journal_path(filepath):
+    return filepath.with_suffix(".journal")
+
+def open_page(filepath, count, default):
+    """Read a page and replay its journal without making it the active one.
+
+    Returns what load and Pages keep for it, safe to call off the UI thread.
+    """
+    # Touching an existing file would make its saved index look stale
+    if not filepath.exists():
+        filepath.touch()
+
+    # Lines are read from the file as they are needed, past its end
+    # they read as the default text
+    result = PhraseFile.Phrases(filepath, count, default)
+    lines = replay(get_journal_path(filepath), result)
+    return {"phrases": result, "snapshot_path": filepath, "journal_lines": lines}
+
+def load(filepath, count, default):
+    """Load the snapshot, replay the journal on top and pad to count phrases"""
+    global phrases, pending, snapshot_path, journal_lines
+
+    snapshot_path = filepath
+    state = open_page(filepath, count, default)
+
+    with store_lock:
+        phrases = state["phrases"]
+        pending = {}
+        journal_lines = state["journal_lines"]
+
+    # Fold what was replayed into the snapshot so the journal starts empty
+    if journal_lines:
+        compact()
+
+    return phrases
+
+def put_away():
+    """Hand the active page's queued changes to the writer before another page is activated"""
+    global pending
+
+    with store_lock:
+        if pending:
+            away.append((snapshot_path, pending))
+            pending = {}
+
+    return bool(away)
+
+def read(filepath, count, default):
+    """The phrases of a file with its journal applied, without taking it over.
+
+    For following a page that another process edits, nothing is written.
+    """
+    result = PhraseFile.Phrases(filepath, count, default)
+    replay(get_journal_path(filepath), result)
+    return result
+
+def replay(filepath, phrases):
+    """Apply the changes in a journal to phrases, returns the number of lines applied"""
+    applied = 0
+
+    try:
+        with open(filepath, "r") as file:
+            for line in file:
+                try:
+                    changes = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    continue
+
+                for i, text in changes.items():
+                    i = int(i)
+
+                    while len(phrases) <= i:
+                        phrases.append("")
+
+                    phrases[i] = text
+
+                applied += 1
+    except FileNotFoundError:
+        pass
+
+    return applied
+
+def append(filepath, changes):
+    """Durably record changed phrases in the journal of a page"""
+    global journal_lines
+
+    journal = journals.get(filepath)
+
+    if not journal:
+        journal = journals[filepath] = open(get_journal_path(filepath), "a")
+
+    journal.write(json.dumps(changes) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+    with store_lock:
+        if filepath == snapshot_path:
+            journal_lines += 1
+
+def record(changes):
+    """Queue changes for the journal, the autosave writer appends them"""
+    with store_lock:
+        pending.update(changes)
+
+    Autosave.mark("phrases")
+
+def flush():
+    """Append queued changes as one journal line per page, called by the writer"""
+    global pending
+
+    with store_lock:
+        batches = away[:]
+        away.clear()
+
+        if pending:
+            batches.append((snapshot_path, pending))
+            pending = {}
+
+    for i, (filepath, changes) in enumerate(batches):
+        try:
+            append(filepath, changes)
+        except Exception:
+            # Put the rest back so the next write retries
+            with store_lock:
+                away[:0] = batches[i:]
+
+            raise
+
+    # Only the active page keeps its journal open
+    for filepath in [filepath for filepath in journals if filepath != snapshot_path]:
+        journals.pop(filepath).close()
+
+    if journal_lines >= COMPACT_AFTER:
+        compact()
+
+def set(i, text):
+    """Change the text of phrase i"""
+    if phrases[i] == text:
+        return
+
+    phrases[i] = text
+    record({i: text})
+
+def swap(i, j):
+    """Swap phrases i and j"""
+    phrases[i], phrases[j] = phrases[j], phrases[i]
+    record({i: phrases[i], j: phrases[j]})
+
+def write_atomic(filepath, text):
+    """Replace a file so readers and crashes only ever see the old or new contents"""
+    tmppath = filepath.with_name(f".{filepath.name}.tmp")
+
+    with open(tmppath, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmppath, filepath)
+
+def compact():
+    """Rewrite the snapshot with every phrase and start a new journal"""
+    global journal_lines
+
+    with store_lock:
+        # Don't strip the joined string to preserve empty lines
+        text = "\n".join(phrases)
+        filepath = snapshot_path
+        # Whatever was queued is part of this snapshot
+        pending.clear()
+        away[:] = [batch for batch in away if batch[0] != filepath]
+
+    write_atomic(filepath, text)
+
+    if filepath in journals:
+        journals.pop(filepath).close()
+
+    # Truncate only after the snapshot is safely in place
+    journals[filepath] = open(get_journal_path(filepath), "w")
+
+    with store_lock:
+        if filepath == snapshot_path:
+            journal_lines = 0
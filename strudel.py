@@ -9,6 +9,11 @@ import speech as Speech
 import settings as Settings
 import filterwid as Filter
 import window as Window
+import autosave as Autosave
+import prerender as Prerender
+import metrics as Metrics
+import overlay as Overlay
+import usage as Usage
 
 def main():
     try:
@@ -17,17 +22,18 @@ def main():
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
 
-        # Make sure Python's signal handling works during Tkinter's mainloop
-        # by ensuring signals are checked regularly
-        def check_signals():
-            # Check signals every 100ms
-            Window.window.after(100, check_signals)
-
         Settings.setup()
+        Autosave.start()
+        Metrics.start()
+        Usage.setup()
         Window.setup()
+        Overlay.setup()
+        Speech.setup()
+        Speech.warm()
+        Prerender.setup()
 
-        # Start the signal checking loop once window is created
-        Window.window.after(100, check_signals)
+        # Wake the event loop for signals once the window is created
+        setup_signals()
         Window.window.after(100, Filter.focus())
 
         Widgets.setup()
@@ -36,13 +42,41 @@ def main():
         print(f"Error in main function: {e}")
         messagebox.showerror("Error", f"An error occurred: {e}")
 
+def setup_signals():
+    """Let signals wake Tk's mainloop instead of checking for them on a timer.
+
+    Python only runs a signal handler once it gets back to running Python
+    code, which it doesn't while Tk waits for events. The signal number is
+    written to a pipe Tk watches, and reading it runs the handler, so an
+    idle app doesn't wake up at all.
+    """
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+    os.set_blocking(read_fd, False)
+    signal.set_wakeup_fd(write_fd)
+
+    def on_wakeup(fd, mask):
+        # The handler has run by the time this is called
+        try:
+            os.read(fd, 512)
+        except BlockingIOError:
+            pass
+
+    Window.window.tk.createfilehandler(read_fd, tk.READABLE, on_wakeup)
+
 def signal_handler(sig, frame):
     """Handle Ctrl+C by cleaning up and exiting gracefully"""
     print("\nExiting Strudel...")
 
     # Stop any speech if running
     try:
-        Speech.stop()
+        Speech.shutdown()
+    except:
+        pass
+
+    # Write out anything the autosave writer hasn't got to yet
+    try:
+        Autosave.flush()
     except:
         pass
 
@@ -0,0 +1,64 @@
+import threading
+import time
+
+# Processes that were told to stop are reaped here, so stopping speech
+# never waits on a synth or player that is slow to exit
+
+GRACE = 1  # Seconds a terminated process gets before it is killed
+POLL = 0.02  # Seconds between checks while something is still exiting
+
+cond = threading.Condition()
+exiting = []  # (deadline, process) for processes that haven't been reaped
+supervisor = None
+
+def end(process, grace=GRACE):
+    """Terminate a process without waiting, it is killed if it outlives grace"""
+    try:
+        process.terminate()
+    except Exception:
+        pass
+
+    watch(process, grace)
+
+def kill(process):
+    """Kill a process without waiting for it to be reaped"""
+    try:
+        process.kill()
+    except Exception:
+        pass
+
+    watch(process, 0)
+
+def watch(process, grace):
+    global supervisor
+
+    with cond:
+        exiting.append((time.monotonic() + grace, process))
+
+        if not supervisor:
+            supervisor = threading.Thread(target=run, daemon=True)
+            supervisor.start()
+
+        cond.notify()
+
+def run():
+    with cond:
+        while True:
+            while not exiting:
+                cond.wait()
+
+            now = time.monotonic()
+
+            # poll reaps the ones that exited
+            exiting[:] = [(deadline, process) for deadline, process in exiting
+                          if process.poll() is None]
+
+            for deadline, process in exiting:
+                if deadline <= now:
+                    try:
+                        process.kill()
+                    except Exception:
+                        pass
+
+            if exiting:
+                cond.wait(POLL)
@@ -0,0 +1,230 @@
+import heapq
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import autosave as Autosave
+import cache as Cache
+import engine as Engine
+import metrics as Metrics
+import settings as Settings
+import store as Store
+
+# Every press is logged with the phrase spoken before it. How often each
+# phrase is spoken and which phrases follow which predict the next press,
+# and after each press the prefetch_count likeliest phrases are rendered
+# into the cache for the current voice.
+
+LOG_LIMIT = 20000  # Log lines kept, older presses are dropped when it grows past this
+PRIOR = 0.2  # Weight of how often a phrase is spoken, against what followed the last one
+
+usage_lock = threading.Lock()
+counts = defaultdict(Counter)  # Presses of each phrase index by page
+totals = Counter()  # Presses by page
+follows = defaultdict(Counter)  # Presses of what came right after (page, index)
+previous = None  # (page, index) spoken last
+predicted = set()  # (page, index) prefetched after the last press
+hits = 0  # Presses of a phrase that was predicted
+misses = 0
+log_lines = 0
+log_pending = []  # Lines waiting for the autosave writer
+prefetched = {}  # Size of the clips rendered ahead by path
+prefetching = False
+
+def get_log_path():
+    thispath = Path(__file__).parent.resolve()
+    filepath = Path(thispath) / "usage.log"
+    return filepath
+
+def setup():
+    """Build the statistics from the log"""
+    global log_lines
+
+    try:
+        with open(get_log_path(), "r") as file:
+            for line in file:
+                try:
+                    _, page, n, prev = line.rstrip("\n").split("\t")
+                    add(page, int(n), None if prev == "-" else int(prev))
+                    log_lines += 1
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    continue
+    except FileNotFoundError:
+        pass
+
+    report()
+
+def add(page, n, prev):
+    counts[page][n] += 1
+    totals[page] += 1
+
+    if prev is not None:
+        follows[(page, prev)][n] += 1
+
+def record(n):
+    """Log a press of phrase n on the current page and prefetch what may come next"""
+    global previous, hits, misses
+
+    page = Settings.get("page")
+    # Only presses on the same page count as following each other
+    prev = previous[1] if previous and previous[0] == page else None
+
+    with usage_lock:
+        if predicted:
+            if (page, n) in predicted:
+                hits += 1
+            else:
+                misses += 1
+
+        add(page, n, prev)
+        previous = (page, n)
+        log_pending.append(f"{time.time():.3f}\t{page}\t{n}\t{'-' if prev is None else prev}\n")
+
+    # The log is written off the UI thread
+    Autosave.mark("usage")
+    prefetch(page, n)
+    report()
+
+def flush():
+    """Append the presses logged since, called by the autosave writer"""
+    global log_pending, log_lines
+
+    with usage_lock:
+        lines = log_pending
+        log_pending = []
+
+    if not lines:
+        return
+
+    try:
+        with open(get_log_path(), "a") as file:
+            file.write("".join(lines))
+
+        log_lines += len(lines)
+
+        if log_lines > LOG_LIMIT:
+            trim()
+    except OSError as e:
+        print(f"Error logging usage: {e}")
+
+def trim():
+    """Keep the newer half of the log, the statistics keep counting everything"""
+    global log_lines
+
+    filepath = get_log_path()
+
+    with open(filepath, "r") as file:
+        lines = file.readlines()[-(LOG_LIMIT // 2):]
+
+    Store.write_atomic(filepath, "".join(lines))
+    log_lines = len(lines)
+
+def predict(page, n, k):
+    """The k phrase indices most likely to be spoken after phrase n"""
+    after = follows.get((page, n), Counter())
+    after_total = sum(after.values())
+    page_counts = counts[page]
+    page_total = totals[page]
+
+    def score(i):
+        next_share = after[i] / after_total if after_total else 0
+        share = page_counts[i] / page_total if page_total else 0
+        return next_share + PRIOR * share
+
+    # Anything not in either of these scores lower than all of them
+    candidates = set(after) | {i for i, _ in page_counts.most_common(k)}
+    return heapq.nlargest(k, candidates, key=score)
+
+def prefetch(page, n):
+    """Render the likeliest next phrases in the background"""
+    global predicted, prefetching
+
+    k = Settings.get("prefetch_count")
+
+    if k <= 0 or Settings.get("cache_size") <= 0:
+        return
+
+    with usage_lock:
+        indices = predict(page, n, k)
+        predicted = {(page, i) for i in indices}
+
+    # A pass is still running, it is only a head start so skip this one
+    if prefetching:
+        return
+
+    num_items = Settings.get("num_items")
+    limit = Settings.get("chunk_length")
+    texts = []
+
+    for i in indices:
+        text = Settings.speech[i].strip() if i < num_items else ""
+
+        # Long texts are spoken in chunks, so those are what gets cached
+        if len(text) > limit:
+            texts.extend(Engine.split_text(text, limit))
+        elif text:
+            texts.append(text)
+
+    params = (Settings.get("synth"), Settings.voice_var.get())
+    keep = {Cache.get_file(Cache.get_key(*params, text)) for text in texts}
+
+    with usage_lock:
+        # Clips of earlier predictions stay cached but stop counting
+        # against the budget, it is for what is likely next
+        for filepath in [filepath for filepath in prefetched if filepath not in keep]:
+            del prefetched[filepath]
+
+    prefetching = True
+    threading.Thread(target=run, args=(texts, params), daemon=True).start()
+
+def run(texts, params):
+    global prefetching
+
+    synth, voice = params
+    budget = Settings.get("prefetch_budget") * 1024 * 1024
+
+    try:
+        for text in texts:
+            if Cache.has(synth, voice, text):
+                continue
+
+            if get_disk() >= budget:
+                break
+
+            filepath = Cache.render(synth, voice, text, background=True)
+
+            if filepath:
+                with usage_lock:
+                    prefetched[filepath] = filepath.stat().st_size
+    except Exception as e:
+        print(f"Error prefetching: {e}")
+    finally:
+        prefetching = False
+
+def get_disk():
+    """Bytes used by clips prefetched for the current prediction that are still in the cache"""
+    with usage_lock:
+        # Evicted since
+        for filepath in [filepath for filepath in prefetched if not filepath.exists()]:
+            del prefetched[filepath]
+
+        return sum(prefetched.values())
+
+def get_memory():
+    """Rough bytes held by the statistics"""
+    with usage_lock:
+        tables = list(counts.values()) + list(follows.values())
+        return sum(sys.getsizeof(table) for table in tables) + sys.getsizeof(follows)
+
+def report():
+    """Publish the hit rate and what prefetching costs as metrics gauges"""
+    presses = hits + misses
+    Metrics.set_gauge("prefetch_hit_rate", round(hits / presses, 3) if presses else 0)
+    Metrics.set_gauge("prefetch_hits", hits)
+    Metrics.set_gauge("prefetch_misses", misses)
+    Metrics.set_gauge("prefetch_disk_bytes", get_disk())
+    Metrics.set_gauge("prefetch_memory_bytes", get_memory())
+    Metrics.set_gauge("usage_log_lines", log_lines)
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from subprocess import Popen, PIPE
+
+catalog = []  # Parsed voices with their language and gender
+
+def get_cache_path():
+    thispath = Path(__file__).parent.resolve()
+    filepath = Path(thispath) / "voices.json"
+    return filepath
+
+def get_synth_key(synth):
+    """Identify the synth binary so the catalog is redone when it changes"""
+    path = shutil.which(synth) or synth
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = 0
+
+    return {"path": os.path.realpath(path), "mtime": mtime}
+
+def parse(output):
+    """Parse the synth's voice listing (skip header line)"""
+    found = []
+
+    for line in output.split("\n")[1:]:
+        parts = line.split()
+
+        if len(parts) > 3:
+            found.append({
+                "name": parts[3],
+                "language": parts[1],
+                # Age/Gender is like M, F or --/M
+                "gender": parts[2].split("/")[-1],
+            })
+
+    return found
+
+def load(synth):
+    """Return the cached catalog if it belongs to this synth, else None"""
+    global catalog
+
+    try:
+        with open(get_cache_path(), "r") as file:
+            cached = json.load(file)
+
+        if cached["synth"] != get_synth_key(synth):
+            return None
+
+        catalog = cached["voices"]
+        return catalog
+    except Exception:
+        return None
+
+def query(synth):
+    """Ask the synth for its voices and cache the parsed catalog"""
+    global catalog
+
+    process = Popen([synth, "--voices=en"], stdout=PIPE)
+    output, _ = process.communicate()
+    catalog = parse(output.decode())
+
+    try:
+        with open(get_cache_path(), "w") as file:
+            json.dump({"synth": get_synth_key(synth), "voices": catalog}, file)
+    except Exception as e:
+        print(f"Error caching voices: {e}")
+
+    return catalog
+
+def discover(synth, on_done):
+    """Query the synth in the background and pass the voice names to on_done"""
+    def run():
+        try:
+            found = query(synth)
+        except Exception as e:
+            print(f"Error getting synth voices: {e}")
+            return
+
+        on_done([voice["name"] for voice in found])
+
+    threading.Thread(target=run, daemon=True).start()
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import tkinter as tk
 
 import speech as Speech
@@ -8,6 +9,11 @@ import settings as Settings
 import controls as Controls
 import widgets as Widgets
 import inputs as Inputs
+import model as Model
+import worker as Worker
+import autosave as Autosave
+import metrics as Metrics
+import overlay as Overlay
 
 window = None
 
@@ -63,9 +69,13 @@ def setup():
 def on_closing():
     """Handle the window closing event"""
     Speech.stop()
+    Speech.shutdown()
+    Worker.shutdown()
     Filter.reset()
     Settings.save_speech()
     Settings.save()
+    # Don't leave before the writer is done
+    Autosave.flush()
     window.destroy()
     sys.exit(0)
 
@@ -75,9 +85,16 @@ def start_keyboard_detection():
 
     This function sets up event bindings for:
     - Enter key to play the first non-empty entry
+    - Shift+Enter to play it right away when speech is queued
     - Ctrl+1 through Ctrl+0 to play entries 1-10
+    - F2 to show or hide the latency overlay
     """
-    window.bind("<Key>", handle_keyboard_shortcuts)
+    window.bind("<Key>", on_key)
+
+def on_key(event):
+    start = time.monotonic()
+    handle_keyboard_shortcuts(event)
+    Metrics.record("key", start)
 
 def handle_keyboard_shortcuts(event):
     """Handle keyboard shortcuts for playing speech entries.
@@ -88,48 +105,49 @@ def handle_keyboard_shortcuts(event):
         if Filter.on_enter():
             return
 
+        # Shift+Enter cuts in front of queued speech
+        now = bool(event.state & 0x1)
+
         # Get focused entry
         focused_entry = get_focused_entry()
 
         if focused_entry:
-            Speech.callback(None, focused_entry)
+            Speech.callback(None, focused_entry, now)
         else:
-            # Find the first non-empty entry
-            for i, entry in enumerate(Inputs.entries):
-
-                if Filter.indices:
-                    if i not in Filter.indices:
-                        continue
-
-                if entry.get().strip():
-                    Speech.callback(i)
-                    break
+            # Find the first non-empty entry, in the order the filter shows them
+            Filter.flush()
+            n = Model.get_first()
+
+            if n is not None:
+                Speech.callback(n, now=now)
+    elif event.keysym == "F2":
+        Overlay.toggle()
     elif event.keysym == "Up":
         if Filter.focused():
-            Inputs.entries[0].focus_set()
+            Inputs.focus_position(0)
             return
 
         # Get focused entry
         focused_entry = get_focused_entry()
 
         if focused_entry:
-            focused_index = Inputs.entries.index(focused_entry)
+            focused_index = Inputs.get_position(focused_entry)
 
             if focused_index > 0:
-                Inputs.entries[focused_index - 1].focus_set()
+                Inputs.focus_position(focused_index - 1)
     elif event.keysym == "Down":
         if Filter.focused():
-            Inputs.entries[0].focus_set()
+            Inputs.focus_position(0)
             return
 
         # Get focused entry
         focused_entry = get_focused_entry()
 
         if focused_entry:
-            focused_index = Inputs.entries.index(focused_entry)
+            focused_index = Inputs.get_position(focused_entry)
 
-            if focused_index < len(Inputs.entries) - 1:
-                Inputs.entries[focused_index + 1].focus_set()
+            if focused_index < len(Model.view) - 1:
+                Inputs.focus_position(focused_index + 1)
 
 def get_focused_entry():
     """Return the currently focused input entry widget, or None if none focused or if focus is elsewhere.
@@ -144,7 +162,7 @@ def get_focused_entry():
         return None
 
     # Check if the focused widget is one of our input entries
-    if focused in Inputs.entries:
+    if Model.get_row(focused) is not None:
         # Return the focused entry
         return focused
 
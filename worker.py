@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+from subprocess import Popen, PIPE
+
+import supervisor as Supervisor
+
+worker_lock = threading.Lock()
+workers = {}  # Warm synth processes by voice
+busy_until = {}  # When each worker is expected to finish speaking
+errors = {}  # Thread reading each worker's stderr and the last lines it read, by pid
+
+def get_args(synth, voice, wpm, amplitude):
+    # Without a text argument the synth speaks stdin line by line
+    return [synth, "-v", voice, "-s", str(wpm), "-a", str(amplitude)]
+
+def spawn(args):
+    process = Popen(args, stdin=PIPE, stderr=PIPE)
+    lines = deque(maxlen=10)
+    # A worker lives long, warnings left in the pipe would fill it and block it
+    thread = threading.Thread(target=drain, args=(process, lines), daemon=True)
+    thread.start()
+    errors[process.pid] = (thread, lines)
+    return process
+
+def drain(process, lines):
+    try:
+        for line in process.stderr:
+            lines.append(line.decode(errors="replace").strip())
+    except Exception:
+        pass
+
+def get_error(process):
+    """What a dead worker had to say last"""
+    thread, lines = errors.pop(process.pid, (None, ()))
+
+    if thread:
+        # Let it read what was written before the worker died
+        thread.join(0.1)
+
+    return "\n".join(lines)
+
+def get(synth, voice, wpm, amplitude):
+    """Return a healthy worker for voice, restarting it if it died or its settings changed"""
+    args = get_args(synth, voice, wpm, amplitude)
+
+    with worker_lock:
+        process = workers.get(voice)
+
+        if process and (process.args != args or process.poll() is not None):
+            Supervisor.kill(process)
+            errors.pop(process.pid, None)
+            process = None
+
+        if not process:
+            process = spawn(args)
+            workers[voice] = process
+
+        return process
+
+def speak(synth, voice, wpm, amplitude, text):
+    """Feed text to the warm worker for voice and return the worker.
+
+    Raises RuntimeError with the synth's message if the worker keeps dying.
+    """
+    # Newlines would split the text into separate utterances
+    line = " ".join(text.splitlines()) + "\n"
+
+    for _ in range(2):
+        process = get(synth, voice, wpm, amplitude)
+
+        try:
+            process.stdin.write(line.encode())
+            process.stdin.flush()
+            busy_until[process.pid] = time.monotonic() + get_duration(text, wpm)
+            return process
+        except (BrokenPipeError, OSError):
+            # The worker died since the health check, try once more with a fresh one
+            error = get_error(process)
+
+    raise RuntimeError(error or "Synth worker exited")
+
+def get_duration(text, wpm):
+    """Generous estimate of how long the synth takes to say text"""
+    # Line mode gives no signal when an utterance ends, numbers and
+    # symbols expand into several words so count characters too
+    words = max(len(text.split()), len(text) / 5)
+    return words / max(wpm, 1) * 60 + 0.5
+
+def is_worker(process):
+    with worker_lock:
+        return any(worker is process for worker in workers.values())
+
+def is_busy(process):
+    return time.monotonic() < busy_until.get(process.pid, 0)
+
+def revive(process):
+    """Replace a worker that was stopped mid-utterance so the next one starts warm"""
+    with worker_lock:
+        for voice, worker in workers.items():
+            if worker is process:
+                busy_until.pop(worker.pid, None)
+                errors.pop(worker.pid, None)
+                Supervisor.kill(worker)
+                del workers[voice]
+                # Spawning takes a few milliseconds, keep it out of the way of stop
+                threading.Thread(target=respawn, args=(voice, worker.args), daemon=True).start()
+                return True
+
+    return False
+
+def respawn(voice, args):
+    with worker_lock:
+        # The next utterance may have started one already
+        if voice not in workers:
+            workers[voice] = spawn(args)
+
+def shutdown():
+    with worker_lock:
+        for process in workers.values():
+            Supervisor.kill(process)
+
+        workers.clear()
+        errors.clear()